@@ -7,6 +7,8 @@ import sys
 import requests
 from requests_oauthlib import OAuth1
 from dotenv import load_dotenv
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))  # For gnip_client.py
+from gnip_client import new_session
 load_dotenv(verbose=True)  # Throws error if it can't find .env file
 
 # Argparse for cli options. Run `python engagement_totals.py -h` to see list of available arguments.
@@ -28,11 +30,13 @@ user_context_auth = OAuth1(CONSUMER_KEY, CONSUMER_SECRET, ACCESS_TOKEN, TOKEN_SE
 # 28hr API endpoint (same for all accounts)
 endpoint = "https://data-api.twitter.com/insights/engagement/28hr"
 
+session = new_session()
+
 
 def main():
     request_body = build_request_body(args.tweet_ids)
     try:
-        response = requests.post(endpoint, auth=user_context_auth, json=request_body)
+        response = session.post(endpoint, auth=user_context_auth, json=request_body)
     except requests.exceptions.RequestException as e:
         print(e)
         sys.exit(120)
@@ -7,6 +7,8 @@ import sys
 import requests
 from requests_oauthlib import OAuth1
 from dotenv import load_dotenv
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))  # For gnip_client.py
+from gnip_client import new_session
 load_dotenv(verbose=True)  # Throws error if it can't find .env file
 
 # Sets creds from '.env' file
@@ -22,6 +24,8 @@ parser.add_argument("-a", "--accept", help="Pass -a to accept the job.", action=
 parser.add_argument("-r", "--reject", help="Pass -r to reject the job.", action="store_true")
 args = parser.parse_args()
 
+session = new_session()
+
 
 def main():
     job_url = args.job_url
@@ -31,7 +35,7 @@ def main():
 
     try:
         print(f"Making request to '{job_action}' the specified job: '{job_uuid}'")
-        response = requests.put(url=job_url, auth=(USERNAME, PASSWORD), json=request_body)
+        response = session.put(url=job_url, auth=(USERNAME, PASSWORD), json=request_body)
     except requests.exceptions.RequestException as e:
         print(e)
         sys.exit(120)
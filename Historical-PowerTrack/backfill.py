@@ -0,0 +1,247 @@
+# Runs a multi-job Historical PowerTrack backfill - splits a backfill spec into one job per rule set
+# per date slice, keeps up to --max_jobs of them in flight, polls them all concurrently, accepts
+# quotes under the given limits and downloads each delivered job. Every job's state is kept in a
+# SQLite file, so re-running the same command after a crash carries on where it stopped.
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from dotenv import load_dotenv
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))  # For gnip_client.py
+from gnip_client import new_session
+from backfill_state import (ACTIVE, DONE, DOWNLOAD_FAILED, DOWNLOADED, DOWNLOADING, PENDING, SUBMITTING,
+                            BackfillState, plan_jobs)
+from downloader import JobDownloader
+from historical_jobs import (MIN_POLL, JobError, JobPoller, create_job, describe_quote, get_job, get_url_list,
+                             list_jobs, parse_job_uuid, quote_decision, set_job_status)
+load_dotenv(verbose=True)  # Throws error if it can't find .env file
+
+# Sets creds from '.env' file
+USERNAME = os.getenv("USERNAME")
+PASSWORD = os.getenv("PASSWORD")
+ACCOUNT_NAME = os.getenv("ACCOUNT_NAME")
+
+# Argparse for cli options. Run `python backfill.py -h` to see list of available arguments.
+parser = argparse.ArgumentParser()
+parser.add_argument("-s", "--spec", default="backfill.json", help="Backfill spec (default: backfill.json)")
+parser.add_argument("--state", default="backfill.db",
+                    help="SQLite file the job states are kept in (default: backfill.db)")
+parser.add_argument("--status", action="store_true", help="Print the state of every job and exit.")
+parser.add_argument("-c", "--max_jobs", type=int, default=2,
+                    help="Jobs in flight at once, up to your account's job limit (default: 2)")
+parser.add_argument("--max_activities", type=int,
+                    help="Accept a quote automatically if estimatedActivityCount is at most this.")
+parser.add_argument("--max_size_mb", type=float,
+                    help="Accept a quote automatically if estimatedFileSizeMb is at most this.")
+parser.add_argument("--reject_over", action="store_true",
+                    help="Reject jobs whose quote is over the limits (default: wait for a manual decision).")
+parser.add_argument("--retry_failed", action="store_true", help="Try creating the jobs the API refused again.")
+parser.add_argument("-o", "--output_dir", default="./downloads",
+                    help="Each job is downloaded to <output_dir>/<job uuid> (default: ./downloads)")
+parser.add_argument("--format", choices=['gz', 'ndjson'], default="gz",
+                    help="Save the files as delivered (.json.gz) or decompressed to NDJSON (.json) (default: gz)")
+parser.add_argument("--validate", action="store_true",
+                    help="Parse every record while downloading and retry files that don't parse")
+parser.add_argument("--download_jobs", type=int, default=1, help="Jobs downloaded at once (default: 1)")
+parser.add_argument("-w", "--workers", type=int, default=8, help="Files downloaded in parallel per job (default: 8)")
+parser.add_argument("--retries", type=int, default=3, help="Retries per file before giving up on it (default: 3)")
+args = parser.parse_args()
+
+AUTH = (USERNAME, PASSWORD)
+
+# Pooled keep-alive session with retries, shared by the polls and the downloads
+session = new_session(pool_size=args.workers * args.download_jobs + args.max_jobs)
+# Job creation is only retried when the job definitely wasn't created (a duplicate job is billed)
+create_session = new_session(retry_statuses=(429, 503), retry_exceptions=False)
+
+
+def main():
+    state = BackfillState(args.state)
+    if args.status:
+        print_status(state)
+        return
+
+    with open(args.spec, "r") as read_file:
+        spec = json.load(read_file)
+    try:
+        state.add_jobs(plan_jobs(spec))
+    except ValueError as e:
+        print(f"{e} - use a new --state file or title for the new rules")
+        sys.exit(1)
+    if args.retry_failed:
+        for job in state.jobs(["failed"]):
+            if job["job_url"] is None:
+                state.update(job["title"], status=PENDING)
+    # Downloads cut off by a crash, or that failed last time, start again (completed files are skipped)
+    for job in state.jobs([DOWNLOADING, DOWNLOAD_FAILED]):
+        state.update(job["title"], status="delivered")
+
+    run(state)
+    print_status(state)
+    failed = state.jobs(["failed", "expired", DOWNLOAD_FAILED])
+    state.close()
+    if failed:
+        sys.exit(1)
+
+
+def run(state):
+    # Polls every job that is due, submits new ones as slots free up and hands delivered jobs to the
+    # download pool, until every job is done
+    pollers = {}  # title -> [JobPoller, time of next poll, quote decision made in this run]
+    downloads = {}  # title -> Future
+    with ThreadPoolExecutor(max_workers=args.max_jobs) as poll_pool, \
+            ThreadPoolExecutor(max_workers=args.download_jobs) as download_pool:
+        while True:
+            if state.jobs([SUBMITTING]):
+                reconcile(state)
+            submit_jobs(state)
+
+            now = time.monotonic()
+            due = [job for job in state.jobs(ACTIVE - {SUBMITTING})
+                   if pollers.setdefault(job["title"], [JobPoller(), now, False])[1] <= now]
+            for job, result in zip(due, poll_pool.map(poll, due)):
+                poller = pollers[job["title"]]
+                if result is None:
+                    poller[1] = time.monotonic() + MIN_POLL * 4
+                    continue
+                poller[2] = apply(state, job, result, decided=poller[2])
+                if result["status"] in ACTIVE:
+                    poller[1] = time.monotonic() + poller[0].next_interval(result)
+                else:
+                    del pollers[job["title"]]
+
+            for job in state.jobs(["delivered"]):
+                if job["title"] not in downloads:
+                    state.update(job["title"], status=DOWNLOADING)
+                    downloads[job["title"]] = download_pool.submit(download, state, job)
+            for title in [title for title, future in downloads.items() if future.done()]:
+                downloads.pop(title).result()  # Raises anything unexpected from the download thread
+
+            if not downloads and all(job["status"] in DONE for job in state.jobs()):
+                return
+            next_poll = min((poller[1] for poller in pollers.values()), default=now + MIN_POLL)
+            time.sleep(min(MIN_POLL, max(1, next_poll - time.monotonic())))
+
+
+def submit_jobs(state):
+    slots = args.max_jobs - len(state.jobs(ACTIVE))
+    for job in state.jobs([PENDING])[:max(0, slots)]:
+        title = job["title"]
+        state.update(title, status=SUBMITTING)
+        try:
+            created = create_job(create_session, ACCOUNT_NAME, json.loads(job["definition"]), AUTH)
+        except requests.exceptions.RequestException as e:
+            # The job may or may not have been created - reconcile() looks it up by title
+            print(f"{title}: {e}")
+            return
+        except JobError as e:
+            print(f"{title}: {e}")
+            state.update(title, status="failed", message=str(e))
+            continue
+        state.update(title, status=created.get("status", "opened"), job_url=created["jobURL"])
+        print(f"{title}: created {created['jobURL']}")
+
+
+def reconcile(state):
+    # Looks up jobs that were being created when the script stopped (or the request failed), using
+    # the list of the account's jobs: found ones get their jobURL, the rest are created again. A found
+    # job is recorded as "opened" whatever its status, so the next poll makes the quote decision and
+    # records the dataURL.
+    try:
+        listed = {job["title"]: job for job in list_jobs(session, ACCOUNT_NAME, AUTH)}
+    except (requests.exceptions.RequestException, JobError) as e:
+        print(e)
+        return
+    for job in state.jobs([SUBMITTING]):
+        found = listed.get(job["title"])
+        if found is None:
+            state.update(job["title"], status=PENDING)
+        else:
+            state.update(job["title"], status="opened", job_url=found["jobURL"])
+
+
+def poll(job):
+    try:
+        return get_job(session, job["job_url"], AUTH)
+    except (requests.exceptions.RequestException, JobError) as e:
+        # A failed poll shouldn't end a job that is still running - try again later
+        print(f"{job['title']}: {e}")
+        return None
+
+
+def apply(state, job, result, decided=False):
+    # Records a job's latest status, and makes the quote decision while the job is quoted and no
+    # decision has been made in this run. Returns whether the decision has been made.
+    title = job["title"]
+    status = result["status"]
+    if status not in ACTIVE | DONE | {"delivered"}:
+        # A status this script doesn't know would never finish - leave the job for a person to look at
+        print(f"{title}: unexpected status '{status}', marking the job failed")
+        state.update(title, status="failed", message=f"unexpected status '{status}'")
+        return decided
+    fields = {"status": status, "percent_complete": result.get("percentComplete"),
+              "message": result.get("statusMessage")}
+    if "quote" in result:
+        fields["quote"] = json.dumps(result["quote"])
+    if status == "delivered":
+        fields["data_url"] = result["results"]["dataURL"]
+    if (status, fields["percent_complete"]) != (job["status"], job["percent_complete"]):
+        print(f"{time.strftime('%H:%M:%S')} {title}: {status} ({result.get('percentComplete', 0)}% complete)")
+    if status == "quoted" and not decided:
+        decided = decide(title, job["job_url"], result.get("quote", {}))
+    state.update(title, **fields)
+
+    return decided
+
+
+def decide(title, job_url, quote):
+    # Returns False if the accept/reject request failed, so it is sent again on the next poll
+    print(f"{title}: quote {describe_quote(quote)}")
+    status = quote_decision(quote, args.max_activities, args.max_size_mb, args.reject_over)
+    if status is None:
+        print(f"{title}: waiting for a manual decision: python accept_or_reject_job.py -j {job_url} -a (or -r)")
+        return True
+    try:
+        set_job_status(session, job_url, status, AUTH)
+    except (requests.exceptions.RequestException, JobError) as e:
+        print(f"{title}: {e}")
+        return False
+    print(f"{title}: made request to '{status}' the job")
+
+    return True
+
+
+def download(state, job):
+    title = job["title"]
+    job_uuid = parse_job_uuid(job["job_url"])
+    try:
+        urls = get_url_list(session, job["data_url"], AUTH)
+        print(f"{title}: downloading {len(urls)} files to {os.path.join(args.output_dir, job_uuid)}")
+        downloader = JobDownloader(session, os.path.join(args.output_dir, job_uuid), args.format, args.validate,
+                                   args.workers, args.retries)
+        failed = downloader.download(urls, job_uuid)
+        downloader.close()
+    except (requests.exceptions.RequestException, JobError) as e:
+        print(f"{title}: {e}")
+        state.update(title, status=DOWNLOAD_FAILED, message=str(e))
+        return
+    if failed:
+        print(f"{title}: {len(failed)} files failed to download")
+        state.update(title, status=DOWNLOAD_FAILED, message=f"{len(failed)} of {len(urls)} files failed")
+    else:
+        state.update(title, status=DOWNLOADED, message=f"{len(urls)} files")
+
+
+def print_status(state):
+    for job in state.jobs():
+        job_uuid = parse_job_uuid(job["job_url"]) if job["job_url"] else "-"
+        print(f"{job['title']:<60} {job_uuid:<12} {job['status']:<16} {job['message'] or ''}")
+    print(", ".join(f"{count} {status}" for status, count in sorted(state.counts().items())))
+
+
+if __name__ == '__main__':
+    main()
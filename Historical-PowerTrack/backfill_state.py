@@ -0,0 +1,108 @@
+# Local state for backfill.py - splits a backfill spec into Historical PowerTrack jobs (one per
+# rule set per date slice) and tracks each job's lifecycle in a SQLite table, so an interrupted
+# backfill carries on from where it stopped.
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+DATE_FORMAT = "%Y%m%d%H%M"
+
+# Local states around the job statuses returned by the API
+PENDING = "pending"  # Not created yet
+SUBMITTING = "submitting"  # Create request sent, jobURL not recorded yet
+DOWNLOADING = "downloading"
+DOWNLOADED = "downloaded"
+DOWNLOAD_FAILED = "download_failed"
+
+ACTIVE = {SUBMITTING, "opened", "estimating", "quoted", "accepted", "running"}  # Count against max jobs
+DONE = {DOWNLOADED, DOWNLOAD_FAILED, "rejected", "failed", "expired"}  # Nothing left to do in this run
+
+
+def plan_jobs(spec):
+    # Returns one job definition per rule set per slice of `sliceDays` days
+    start = datetime.strptime(spec["fromDate"], DATE_FORMAT)
+    end = datetime.strptime(spec["toDate"], DATE_FORMAT)
+    step = timedelta(days=spec.get("sliceDays", 30))
+    jobs = []
+    for rule_set, rules in spec["ruleSets"].items():
+        slice_start = start
+        while slice_start < end:
+            slice_end = min(slice_start + step, end)
+            from_date, to_date = slice_start.strftime(DATE_FORMAT), slice_end.strftime(DATE_FORMAT)
+            jobs.append({
+                "publisher": spec.get("publisher", "twitter"),
+                "dataFormat": spec.get("dataFormat", "original"),
+                "fromDate": from_date,
+                "toDate": to_date,
+                "title": f"{spec['title']}-{rule_set}-{from_date}-{to_date}",  # Titles must be unique
+                "rules": rules,
+            })
+            slice_start = slice_end
+
+    return jobs
+
+
+def rules_hash(rules):
+    return hashlib.sha256(json.dumps(rules, sort_keys=True).encode()).hexdigest()
+
+
+class BackfillState:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        # The monitor loop and the download threads share the one connection, serialized by the lock
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                title TEXT PRIMARY KEY,
+                definition TEXT NOT NULL,
+                rules_hash TEXT NOT NULL,
+                status TEXT NOT NULL,
+                job_url TEXT,
+                data_url TEXT,
+                percent_complete REAL,
+                quote TEXT,
+                message TEXT,
+                updated_at REAL NOT NULL
+            )""")
+        self.connection.commit()
+
+    def add_jobs(self, jobs):
+        # Adds the jobs that aren't in the table yet. Raises ValueError if a job's rules no longer
+        # match the ones it was created with.
+        with self.lock:
+            for job in jobs:
+                digest = rules_hash(job["rules"])
+                row = self.connection.execute("SELECT rules_hash FROM jobs WHERE title = ?",
+                                              (job["title"],)).fetchone()
+                if row is None:
+                    self.connection.execute("INSERT INTO jobs (title, definition, rules_hash, status, updated_at) "
+                                            "VALUES (?, ?, ?, ?, ?)",
+                                            (job["title"], json.dumps(job), digest, PENDING, time.time()))
+                elif row["rules_hash"] != digest:
+                    raise ValueError(f"The rules for '{job['title']}' changed since the backfill started")
+            self.connection.commit()
+
+    def update(self, title, **fields):
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{column} = ?" for column in fields)
+        with self.lock:
+            self.connection.execute(f"UPDATE jobs SET {columns} WHERE title = ?", (*fields.values(), title))
+            self.connection.commit()
+
+    def jobs(self, statuses=None):
+        with self.lock:
+            rows = self.connection.execute("SELECT * FROM jobs ORDER BY title").fetchall()
+
+        return [dict(row) for row in rows if statuses is None or row["status"] in statuses]
+
+    def counts(self):
+        with self.lock:
+            return dict(self.connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def close(self):
+        self.connection.close()
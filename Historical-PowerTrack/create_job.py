@@ -6,6 +6,8 @@ import sys
 import requests
 from requests_oauthlib import OAuth1
 from dotenv import load_dotenv
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))  # For gnip_client.py
+from gnip_client import new_session
 load_dotenv(verbose=True)  # Throws error if it can't find .env file
 
 # Sets creds from '.env' file
@@ -17,13 +19,16 @@ ACCOUNT_NAME = os.getenv("ACCOUNT_NAME")
 domain = "https://gnip-api.gnip.com"
 endpoint = f"{domain}/historical/powertrack/accounts/{ACCOUNT_NAME}/publishers/twitter/jobs.json"
 
+# Job creation is only retried when the job definitely wasn't created (a duplicate job is billed)
+session = new_session(retry_statuses=(429, 503), retry_exceptions=False)
+
 
 def main():
     if os.path.exists('historical_job.json') and os.path.getsize('historical_job.json') > 0:
         job_data = build_request_body("historical_job.json")
         try:
             print("Creating Historical PowerTrack job...")
-            response = requests.post(endpoint, auth=(USERNAME, PASSWORD), json=job_data)
+            response = session.post(endpoint, auth=(USERNAME, PASSWORD), json=job_data)
         except requests.exceptions.RequestException as e:
             print(e)
             sys.exit(120)
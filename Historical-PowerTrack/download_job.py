@@ -1,12 +1,15 @@
 # Pass in dataURL to retrieve list of URLs and download corresponding data files
 
 import argparse
-import gzip
 import json
 import os
+import sys
 
 import requests
 from dotenv import load_dotenv
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))  # For gnip_client.py
+from gnip_client import new_session
+from downloader import JobDownloader
 load_dotenv(verbose=True)  # Throws error if it can't find .env file
 
 # Sets creds from '.env' file
@@ -18,69 +21,49 @@ ACCOUNT_NAME = os.getenv("ACCOUNT_NAME")
 parser = argparse.ArgumentParser()
 parser.add_argument("-d", "--data_url", required=True,
                     help="Pass the `dataURL` value returned in the response from a completed job. URL ends in /results.json")
+parser.add_argument("--format", choices=['gz', 'ndjson'], default="gz",
+                    help="Save the files as delivered (.json.gz) or decompressed to NDJSON (.json) (default: gz)")
+parser.add_argument("--validate", action="store_true",
+                    help="Parse every record while downloading and retry files that don't parse")
+parser.add_argument("--verify", action="store_true",
+                    help="Check every file in the job against the manifest and re-download only the bad ones")
+parser.add_argument("-w", "--workers", type=int, default=8, help="Files downloaded in parallel (default: 8)")
+parser.add_argument("--retries", type=int, default=3, help="Retries per file before giving up on it (default: 3)")
 args = parser.parse_args()
 
+session = new_session(pool_size=args.workers)
+
 
 def main():
     data_url = args.data_url
     job_uuid = data_url.rsplit('/', 2)[1]
 
     urls = get_url_list(data_url)
-    total_files = len(urls)
-    files_retrieved = 0
-
-    # Create downloads directory 
-    if not os.path.exists('./downloads'):
-        os.makedirs('./downloads')
+    print(f"Downloading {len(urls)} files with {args.workers} workers...")
 
-    for link in urls:
-        file_name = create_file_name(link, job_uuid)
-        files_retrieved += 1
-        # Downloads file if it doesn't exist (helps if restarting download due to error)
-        if not os.path.isfile(f"./downloads/{file_name}"):
-            data = get_data(link)
-            # Verbose - comment out line below to remove verbose print statement
-            print(f"Downloading file {files_retrieved}/{total_files}...")
-            with open(f"./downloads/{file_name}", "w") as outfile:
-                json.dump(data, outfile)
+    downloader = JobDownloader(session, "./downloads", args.format, args.validate, args.workers, args.retries)
+    failed = downloader.download(urls, job_uuid, verify=args.verify)
+    files, size, records = downloader.manifest.totals(job_uuid)
+    downloader.close()
+    print(f"Manifest: {files} files, {size / 1e6:.1f} MB, {records} records.")
+    if failed:
+        print(f"{len(failed)} files failed to download, run the script again to retry them.")
+        sys.exit(1)
 
 
 # Function that gets the urls containing the actual Tweet data
 def get_url_list(url):
-    response = requests.get(url, auth=(USERNAME, PASSWORD))
-    if response.status_code is not 200:
+    try:
+        response = session.get(url, auth=(USERNAME, PASSWORD))
+    except requests.exceptions.RequestException as e:
+        print(e)
+        sys.exit(120)
+    if response.status_code != 200:
         print(f"The request returned an error: {response.text}")
+        sys.exit(1)
     parsed = json.loads(response.text)
     return parsed['urlList']
 
 
-# Function that gets tweets data from each url in the results.json
-def get_data(url):
-    headers = {
-        "Accept-Encoding": "gzip"
-    }
-
-    response = requests.get(url, headers=headers)
-    if response.status_code is not 200:
-        print(f"The request returned an error: {response.text}")
-    result = gzip.decompress(response.content)
-    list_items = result.decode('utf-8').split('\n')
-    # list items contains a list of strings
-    data = []
-    for item in list_items:
-        # convert each string to json
-        data.append(json.loads(item))
-    return data;
-
-
-# Helper function that creates a file name from url string to store the json
-def create_file_name(url, job_uuid):
-    left = f"{job_uuid}/"
-    right = ".json.gz"
-
-    file_name = url[url.index(left) + len(left):url.index(right)].replace("/", "_")
-    return f"{file_name}.json"
-
-
 if __name__ == '__main__':
     main()
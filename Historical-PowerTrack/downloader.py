@@ -0,0 +1,235 @@
+# Concurrent download engine for Historical PowerTrack data files - a bounded thread pool that
+# retries each file with backoff and keeps a one-line progress/throughput display up to date.
+# JobDownloader streams a job's files to disk and records each one in the download manifest.
+import json
+import os
+import random
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from manifest import HashingWriter, Manifest
+
+CHUNK_SIZE = 1 << 20  # Files are streamed to disk 1MB at a time
+
+# Network errors, truncated bodies, and (with validation) records that don't parse
+DOWNLOAD_ERRORS = (requests.exceptions.RequestException, OSError, EOFError, ValueError, zlib.error)
+
+
+def gunzip_chunks(chunks):
+    # Decompresses a stream of gzip chunks, including files made of several gzip members
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    fed = False
+    for chunk in chunks:
+        while chunk:
+            fed = True
+            yield decompressor.decompress(chunk)
+            if not decompressor.eof:
+                break
+            chunk = decompressor.unused_data
+            decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+            fed = False
+    if fed:
+        # A body cut off mid-transfer - raised so the file is retried
+        raise EOFError("compressed file ended before the end-of-stream marker was reached")
+
+
+def iter_lines(chunks):
+    # Splits a stream of byte chunks into lines without the newline, skipping empty lines
+    pending = b""
+    for chunk in chunks:
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield line.rstrip(b"\r")
+    if pending.strip():
+        yield pending.rstrip(b"\r")
+
+
+class Progress:
+    def __init__(self, total, stream=sys.stderr, interval=0.5):
+        self.total = total
+        self.stream = stream
+        self.interval = interval
+        self.done = 0
+        self.skipped = 0
+        self.failed = 0
+        self.bytes = 0
+        self.started = time.monotonic()
+        self.last_render = 0.0
+        self.lock = threading.Lock()
+
+    def update(self, nbytes=0, skipped=False, failed=False):
+        with self.lock:
+            self.done += 1
+            self.bytes += nbytes
+            self.skipped += skipped
+            self.failed += failed
+            now = time.monotonic()
+            if now - self.last_render >= self.interval or self.done == self.total:
+                self.last_render = now
+                self.render(now)
+
+    def render(self, now):
+        elapsed = max(now - self.started, 1e-6)
+        megabytes = self.bytes / 1e6
+        self.stream.write(f"\r{self.done}/{self.total} files ({self.skipped} skipped, {self.failed} failed), "
+                          f"{megabytes:.1f} MB, {megabytes / elapsed:.2f} MB/s, {self.done / elapsed:.1f} files/s  ")
+        if self.done == self.total:
+            self.stream.write("\n")
+        self.stream.flush()
+
+
+def with_retries(fetch, item, retries=3, backoff=2.0):
+    # Retries the whole file (including a body cut off mid-transfer) with jittered backoff
+    attempt = 0
+    while True:
+        try:
+            return fetch(item)
+        except DOWNLOAD_ERRORS as e:
+            if attempt >= retries:
+                raise
+            delay = random.uniform(0, backoff * 2 ** attempt)
+            sys.stderr.write(f"\nRetrying {item} in {delay:.1f}s ({e.__class__.__name__}: {e})\n")
+            time.sleep(delay)
+            attempt += 1
+
+
+def download_all(items, fetch, skip=None, workers=8, retries=3, backoff=2.0):
+    """
+    Calls fetch(item) for every item not matched by skip(item), `workers` at a time. fetch
+    returns the number of bytes it wrote. Returns the items that still failed after retrying.
+    """
+    progress = Progress(len(items))
+    failed = []
+
+    def run(item):
+        if skip is not None and skip(item):
+            progress.update(skipped=True)
+            return
+        try:
+            nbytes = with_retries(fetch, item, retries, backoff)
+        except DOWNLOAD_ERRORS as e:
+            sys.stderr.write(f"\nGave up on {item}: {e}\n")
+            failed.append(item)
+            progress.update(failed=True)
+            return
+        progress.update(nbytes)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # list() so an unexpected exception in a worker is raised here
+        list(executor.map(run, items))
+
+    return failed
+
+
+class JobDownloader:
+    """
+    Downloads the data files of one or more jobs into `output_dir`, `workers` at a time. Files
+    are written to '<name>.part', fsynced and renamed, then recorded in 'manifest.db' with their
+    size, record count and SHA-256.
+    """
+
+    def __init__(self, session, output_dir="./downloads", file_format="gz", validate=False, workers=8, retries=3):
+        self.session = session
+        self.output_dir = output_dir
+        self.file_format = file_format
+        self.validate = validate
+        self.workers = workers
+        self.retries = retries
+        os.makedirs(output_dir, exist_ok=True)
+        self.manifest = Manifest(os.path.join(output_dir, "manifest.db"))
+
+    def download(self, urls, job_uuid, verify=False):
+        # Returns the urls that still failed after retrying
+        # Skips files the manifest says are complete (helps if restarting download due to error)
+        skip = lambda link: self.manifest.is_complete(self.file_path(link, job_uuid), self.file_name(link, job_uuid))
+        if verify:
+            urls = self.verify_files(urls, job_uuid)
+            print(f"Re-downloading {len(urls)} files...")
+            skip = None
+
+        return download_all(urls, lambda link: self.download_file(link, job_uuid), skip=skip,
+                            workers=self.workers, retries=self.retries)
+
+    def verify_files(self, urls, job_uuid):
+        # Checksums every file in parallel and returns the urls whose files need fetching again
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            problems = list(executor.map(
+                lambda link: self.manifest.verify(self.file_path(link, job_uuid), self.file_name(link, job_uuid)), urls))
+        bad = []
+        for link, problem in zip(urls, problems):
+            if problem is not None:
+                print(f"{self.file_name(link, job_uuid)}: {problem}")
+                bad.append(link)
+        print(f"Verified {len(urls)} files: {len(urls) - len(bad)} intact, {len(bad)} bad.")
+
+        return bad
+
+    def download_file(self, link, job_uuid):
+        # Returns the number of bytes written
+        path = self.file_path(link, job_uuid)
+        tmp_path = f"{path}.part"
+        try:
+            with open(tmp_path, "wb") as outfile:
+                writer = HashingWriter(outfile)
+                records = self.get_data(link, writer)
+                outfile.flush()
+                os.fsync(outfile.fileno())
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, path)
+        self.manifest.record(self.file_name(link, job_uuid), link, writer.bytes, records, writer.sha256.hexdigest())
+
+        return writer.bytes
+
+    def get_data(self, url, outfile):
+        # Streams one data file into outfile and returns its number of records. The stream is
+        # always decompressed, so a truncated file is caught here.
+        headers = {"Accept-Encoding": "gzip"}
+        with self.session.get(url, headers=headers, stream=True) as response:
+            # Raising lets the file be retried instead of saving the error body
+            response.raise_for_status()
+            chunks = response.iter_content(CHUNK_SIZE)
+            if self.file_format == "gz":
+                chunks = write_through(chunks, outfile)
+            records = 0
+            for line in iter_lines(gunzip_chunks(chunks)):
+                if self.validate:
+                    json.loads(line)  # A ValueError here fails the file
+                if self.file_format == "ndjson":
+                    outfile.write(line + b"\n")
+                records += 1
+
+            return records
+
+    def file_name(self, link, job_uuid):
+        extension = ".gz" if self.file_format == "gz" else ""
+        return f"{create_file_name(link, job_uuid)}{extension}"
+
+    def file_path(self, link, job_uuid):
+        return os.path.join(self.output_dir, self.file_name(link, job_uuid))
+
+    def close(self):
+        self.manifest.close()
+
+
+def write_through(chunks, outfile):
+    # Saves the compressed chunks while passing them on to be decompressed
+    for chunk in chunks:
+        outfile.write(chunk)
+        yield chunk
+
+
+# Helper function that creates a file name from url string to store the json
+def create_file_name(url, job_uuid):
+    left = f"{job_uuid}/"
+    right = ".json.gz"
+
+    file_name = url[url.index(left) + len(left):url.index(right)].replace("/", "_")
+    return f"{file_name}.json"
@@ -0,0 +1,108 @@
+# Historical PowerTrack job API helpers for the scripts that drive a job end to end (run_job.py
+# and backfill.py) - create, list, poll, accept/reject and results, plus the adaptive poll interval.
+import json
+import time
+
+DOMAIN = "https://gnip-api.gnip.com"
+FINISHED = {"delivered", "rejected", "failed", "expired"}
+MIN_POLL = 15
+MAX_POLL = 600
+
+
+class JobError(Exception):
+    pass
+
+
+def jobs_endpoint(account_name):
+    return f"{DOMAIN}/historical/powertrack/accounts/{account_name}/publishers/twitter/jobs.json"
+
+
+def parse_job_uuid(job_url):
+    split_on_slash = job_url.rsplit('/', 1).pop()
+    job_uuid = split_on_slash.split('.', 1).pop(0)
+
+    return job_uuid
+
+
+def parse_response(response):
+    if response.status_code not in (200, 201):
+        raise JobError(f"status {response.status_code}: {response.text}")
+
+    return json.loads(response.text)
+
+
+def create_job(session, account_name, job_data, auth):
+    return parse_response(session.post(jobs_endpoint(account_name), auth=auth, json=job_data))
+
+
+def get_job(session, job_url, auth):
+    return parse_response(session.get(job_url, auth=auth))
+
+
+def set_job_status(session, job_url, status, auth):
+    # status is "accept" or "reject"
+    return parse_response(session.put(url=job_url, auth=auth, json={"status": status}))
+
+
+def list_jobs(session, account_name, auth):
+    return parse_response(session.get(jobs_endpoint(account_name), auth=auth)).get("jobs", [])
+
+
+def get_url_list(session, data_url, auth):
+    return parse_response(session.get(data_url, auth=auth))["urlList"]
+
+
+def quote_within(quote, max_activities=None, max_size_mb=None):
+    # True if the quote is under every threshold that was given. The API sends the estimates as
+    # strings (e.g. "7.0"), so they're converted before comparing.
+    activities = int(float(quote.get("estimatedActivityCount") or 0))
+    size_mb = float(quote.get("estimatedFileSizeMb") or 0)
+    if max_activities is not None and activities > max_activities:
+        return False
+    if max_size_mb is not None and size_mb > max_size_mb:
+        return False
+
+    return True
+
+
+def quote_decision(quote, max_activities=None, max_size_mb=None, reject_over=False):
+    # "accept", "reject", or None to leave the decision to a person
+    if max_activities is None and max_size_mb is None:
+        return None
+    if quote_within(quote, max_activities, max_size_mb):
+        return "accept"
+
+    return "reject" if reject_over else None
+
+
+def describe_quote(quote):
+    return (f"~{quote.get('estimatedActivityCount', '?')} activities, ~{quote.get('estimatedFileSizeMb', '?')} MB, "
+            f"~{quote.get('estimatedDurationHours', '?')} hours")
+
+
+class JobPoller:
+    """
+    Picks the next poll interval for a job. While it runs, the interval is a quarter of the
+    expected time left - from how fast percentComplete has moved so far, or the quote's
+    estimatedDurationHours before there is any progress - between MIN_POLL and MAX_POLL seconds.
+    """
+
+    def __init__(self):
+        self.first = None  # (time, percentComplete) when the job was first seen running
+
+    def next_interval(self, job):
+        if job["status"] != "running":
+            # Estimating, and waiting on the quote decision, take minutes at most
+            return MIN_POLL
+        now = time.monotonic()
+        percent = float(job.get("percentComplete", 0))
+        if self.first is None or percent < self.first[1]:
+            self.first = (now, percent)
+        started, first_percent = self.first
+        if percent > first_percent:
+            remaining = (100 - percent) * (now - started) / (percent - first_percent)
+        else:
+            hours = float(job.get("quote", {}).get("estimatedDurationHours", 0) or 0)
+            remaining = hours * 3600 * (100 - percent) / 100
+
+        return min(MAX_POLL, max(MIN_POLL, remaining / 4))
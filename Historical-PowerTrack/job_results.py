@@ -10,6 +10,8 @@ import sys
 import requests
 from requests_oauthlib import OAuth1
 from dotenv import load_dotenv
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))  # For gnip_client.py
+from gnip_client import new_session
 load_dotenv(verbose=True)  # Throws error if it can't find .env file
 
 # Sets creds from '.env' file
@@ -23,13 +25,15 @@ parser.add_argument("-d", "--data_url", required=True,
                     help="Pass the `dataURL` value returned in the response from a completed job.")
 args = parser.parse_args()
 
+session = new_session()
+
 
 def main():
     data_url = args.data_url
     job_uuid = data_url.rsplit('/', 2)[1]
     try:
         print(f"Retrieving results for job: '{job_uuid}'")
-        response = requests.get(url=data_url, auth=(USERNAME, PASSWORD))
+        response = session.get(url=data_url, auth=(USERNAME, PASSWORD))
     except requests.exceptions.RequestException as e:
         print(e)
         sys.exit(120)
@@ -7,6 +7,8 @@ import sys
 import requests
 from requests_oauthlib import OAuth1
 from dotenv import load_dotenv
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))  # For gnip_client.py
+from gnip_client import new_session
 load_dotenv(verbose=True)  # Throws error if it can't find .env file
 
 # Sets creds from '.env' file
@@ -18,11 +20,13 @@ ACCOUNT_NAME = os.getenv("ACCOUNT_NAME")
 domain = "https://gnip-api.gnip.com"
 endpoint = f"{domain}/historical/powertrack/accounts/{ACCOUNT_NAME}/publishers/twitter/jobs.json"
 
+session = new_session()
+
 
 def main():
     try:
         print(f"Retrieving active jobs under your account: '{ACCOUNT_NAME}'...")
-        response = requests.get(endpoint, auth=(USERNAME, PASSWORD))
+        response = session.get(endpoint, auth=(USERNAME, PASSWORD))
     except requests.exceptions.RequestException as e:
         print(e)
         sys.exit(120)
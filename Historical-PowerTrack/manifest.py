@@ -0,0 +1,97 @@
+# Download manifest for Historical PowerTrack jobs - a SQLite table recording the size, record
+# count and SHA-256 of every file that was downloaded completely, so restarts and --verify never
+# have to trust a file just because it exists.
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+CHUNK_SIZE = 1 << 20
+
+
+class HashingWriter:
+    # Wraps a binary file, hashing and counting everything written to it
+    def __init__(self, file):
+        self.file = file
+        self.sha256 = hashlib.sha256()
+        self.bytes = 0
+
+    def write(self, data):
+        self.file.write(data)
+        self.sha256.update(data)
+        self.bytes += len(data)
+
+
+def sha256_file(path):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as read_file:
+        for chunk in iter(lambda: read_file.read(CHUNK_SIZE), b""):
+            sha256.update(chunk)
+
+    return sha256.hexdigest()
+
+
+class Manifest:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        # Download workers share the one connection, serialized by the lock
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                file_name TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                bytes INTEGER NOT NULL,
+                records INTEGER,
+                sha256 TEXT NOT NULL,
+                downloaded_at REAL NOT NULL
+            )""")
+        self.connection.commit()
+
+    def record(self, file_name, url, size, records, sha256):
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                                    (file_name, url.split("?", 1)[0], size, records, sha256, time.time()))
+            self.connection.commit()
+
+    def get(self, file_name):
+        with self.lock:
+            row = self.connection.execute("SELECT bytes, records, sha256 FROM files WHERE file_name = ?",
+                                          (file_name,)).fetchone()
+        if row is None:
+            return None
+
+        return {"bytes": row[0], "records": row[1], "sha256": row[2]}
+
+    def totals(self, job_uuid=None):
+        # Files, bytes and records recorded - for one job if given (its uuid is part of every file url)
+        query = "SELECT COUNT(*), COALESCE(SUM(bytes), 0), COALESCE(SUM(records), 0) FROM files"
+        params = ()
+        if job_uuid is not None:
+            query += " WHERE instr(url, ?) > 0"
+            params = (f"/{job_uuid}/",)
+        with self.lock:
+            return self.connection.execute(query, params).fetchone()
+
+    def close(self):
+        self.connection.close()
+
+    def is_complete(self, path, file_name):
+        # Cheap check used when skipping files: recorded, and the size on disk still matches
+        entry = self.get(file_name)
+        return entry is not None and os.path.isfile(path) and os.path.getsize(path) == entry["bytes"]
+
+    def verify(self, path, file_name):
+        # Full check: returns a description of the problem, or None if the file is intact
+        entry = self.get(file_name)
+        if entry is None:
+            return "not in manifest"
+        if not os.path.isfile(path):
+            return "missing"
+        if os.path.getsize(path) != entry["bytes"]:
+            return f"size {os.path.getsize(path)} != {entry['bytes']}"
+        if sha256_file(path) != entry["sha256"]:
+            return "checksum mismatch"
+
+        return None
@@ -7,6 +7,8 @@ import sys
 import requests
 from requests_oauthlib import OAuth1
 from dotenv import load_dotenv
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))  # For gnip_client.py
+from gnip_client import new_session
 load_dotenv(verbose=True)  # Throws error if it can't find .env file
 
 # Argparse for cli options. Run `python monitor_job.py -h` to see list of available arguments.
@@ -20,6 +22,8 @@ USERNAME = os.getenv("USERNAME")
 PASSWORD = os.getenv("PASSWORD")
 ACCOUNT_NAME = os.getenv("ACCOUNT_NAME")
 
+session = new_session()
+
 
 def main():
     job_url = args.job_url
@@ -27,7 +31,7 @@ def main():
 
     try:
         print(f"Checking the status of your job: {job_uuid}...")
-        response = requests.get(job_url, auth=(USERNAME, PASSWORD))
+        response = session.get(job_url, auth=(USERNAME, PASSWORD))
     except requests.exceptions.RequestException as e:
         print(e)
         sys.exit(120)
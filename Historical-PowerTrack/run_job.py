@@ -0,0 +1,133 @@
+# Runs a Historical PowerTrack job end to end - creates it (or picks up an existing one), polls it
+# at an adaptive interval, accepts the quote automatically when it is under the given limits, and
+# downloads the data files as soon as the job is delivered.
+import argparse
+import json
+import os
+import sys
+import time
+
+import requests
+from dotenv import load_dotenv
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))  # For gnip_client.py
+from gnip_client import new_session
+from downloader import JobDownloader
+from historical_jobs import (FINISHED, MIN_POLL, JobError, JobPoller, create_job, describe_quote, get_job,
+                             get_url_list, parse_job_uuid, quote_decision, set_job_status)
+load_dotenv(verbose=True)  # Throws error if it can't find .env file
+
+# Sets creds from '.env' file
+USERNAME = os.getenv("USERNAME")
+PASSWORD = os.getenv("PASSWORD")
+ACCOUNT_NAME = os.getenv("ACCOUNT_NAME")
+
+# Argparse for cli options. Run `python run_job.py -h` to see list of available arguments.
+parser = argparse.ArgumentParser()
+job_source = parser.add_mutually_exclusive_group()
+job_source.add_argument("-f", "--job_file", default="historical_job.json",
+                        help="Job definition to create (default: historical_job.json)")
+job_source.add_argument("-j", "--job_url", help="Pick up an existing job instead of creating one.")
+parser.add_argument("--max_activities", type=int,
+                    help="Accept the quote automatically if estimatedActivityCount is at most this.")
+parser.add_argument("--max_size_mb", type=float,
+                    help="Accept the quote automatically if estimatedFileSizeMb is at most this.")
+parser.add_argument("--reject_over", action="store_true",
+                    help="Reject the job if the quote is over the limits (default: wait for a manual decision).")
+parser.add_argument("--no_download", action="store_true", help="Stop once the job is delivered.")
+parser.add_argument("-o", "--output_dir", default="./downloads", help="Download directory (default: ./downloads)")
+parser.add_argument("--format", choices=['gz', 'ndjson'], default="gz",
+                    help="Save the files as delivered (.json.gz) or decompressed to NDJSON (.json) (default: gz)")
+parser.add_argument("--validate", action="store_true",
+                    help="Parse every record while downloading and retry files that don't parse")
+parser.add_argument("-w", "--workers", type=int, default=8, help="Files downloaded in parallel (default: 8)")
+parser.add_argument("--retries", type=int, default=3, help="Retries per file before giving up on it (default: 3)")
+args = parser.parse_args()
+
+AUTH = (USERNAME, PASSWORD)
+
+session = new_session(pool_size=args.workers)
+# Job creation is only retried when the job definitely wasn't created (a duplicate job is billed)
+create_session = new_session(retry_statuses=(429, 503), retry_exceptions=False)
+
+
+def main():
+    job_url = args.job_url or create(args.job_file)
+    job_uuid = parse_job_uuid(job_url)
+    data_url = wait_for_delivery(job_url, job_uuid)
+    if args.no_download:
+        print(f"dataURL: {data_url}")
+        return
+
+    try:
+        urls = get_url_list(session, data_url, AUTH)
+    except (requests.exceptions.RequestException, JobError) as e:
+        print(e)
+        sys.exit(120)
+    print(f"Downloading {len(urls)} files with {args.workers} workers...")
+    downloader = JobDownloader(session, args.output_dir, args.format, args.validate, args.workers, args.retries)
+    failed = downloader.download(urls, job_uuid)
+    downloader.close()
+    if failed:
+        print(f"{len(failed)} files failed to download, retry them with: python download_job.py -d {data_url}")
+        sys.exit(1)
+    print("Job complete.")
+
+
+def create(job_file):
+    with open(job_file, "r") as read_file:
+        job_data = json.load(read_file)
+    try:
+        print(f"Creating Historical PowerTrack job '{job_data.get('title')}'...")
+        job = create_job(create_session, ACCOUNT_NAME, job_data, AUTH)
+    except (requests.exceptions.RequestException, JobError) as e:
+        print(e)
+        sys.exit(120)
+    print(f"jobURL: {job['jobURL']}")
+
+    return job["jobURL"]
+
+
+def wait_for_delivery(job_url, job_uuid):
+    # Polls until the job is delivered and returns its dataURL
+    poller = JobPoller()
+    last_state = None
+    while True:
+        try:
+            job = get_job(session, job_url, AUTH)
+        except (requests.exceptions.RequestException, JobError) as e:
+            # A failed poll shouldn't end a job that is still running - try again later
+            print(e)
+            time.sleep(MIN_POLL * 4)
+            continue
+        status = job["status"]
+        state = (status, job.get("percentComplete"))
+        if state != last_state:
+            print(f"{time.strftime('%H:%M:%S')} {job_uuid}: {status} ({job.get('percentComplete', 0)}% complete)")
+            if status == "quoted":
+                decide(job, job_url)
+            last_state = state
+        if status == "delivered":
+            return job["results"]["dataURL"]
+        if status in FINISHED:
+            print(f"Job {status}. {job.get('statusMessage', '')}".strip())
+            sys.exit(1)
+        time.sleep(poller.next_interval(job))
+
+
+def decide(job, job_url):
+    quote = job.get("quote", {})
+    print(f"Quote: {describe_quote(quote)}")
+    status = quote_decision(quote, args.max_activities, args.max_size_mb, args.reject_over)
+    if status is None:
+        print(f"Waiting for a manual decision: python accept_or_reject_job.py -j {job_url} -a (or -r)")
+        return
+    try:
+        print(f"Making request to '{status}' the job")
+        set_job_status(session, job_url, status, AUTH)
+    except (requests.exceptions.RequestException, JobError) as e:
+        print(e)
+        sys.exit(120)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,18 @@
+# Run with `python -m pytest` from the Historical-PowerTrack folder
+from historical_jobs import quote_decision, quote_within
+
+# Estimates as the API returns them - strings, not numbers
+QUOTE = {"estimatedActivityCount": "2500", "estimatedFileSizeMb": "7.0", "estimatedDurationHours": "1.0"}
+
+
+def test_quote_within_string_estimates():
+    assert quote_within(QUOTE, max_activities=2500, max_size_mb=7.0)
+    assert not quote_within(QUOTE, max_activities=2499)
+    assert not quote_within(QUOTE, max_size_mb=6.5)
+
+
+def test_quote_decision_string_estimates():
+    assert quote_decision(QUOTE, max_size_mb=10) == "accept"
+    assert quote_decision(QUOTE, max_size_mb=5) is None
+    assert quote_decision(QUOTE, max_size_mb=5, reject_over=True) == "reject"
+    assert quote_decision(QUOTE) is None
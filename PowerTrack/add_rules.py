@@ -8,11 +8,21 @@ import zlib
 
 import requests
 from dotenv import load_dotenv
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))  # For gnip_client.py
+from gnip_client import new_session
+from rule_linter import valid_rules
+from rules import build_batches, load_rules, report_failures, send_batches
 load_dotenv(verbose=True)  # Throws error if it can't find .env file
 
 # Argparse for cli options. Run `python engagement_totals.py -h` to see list of available arguments.
 parser = argparse.ArgumentParser()
-parser.add_argument("-r", "--rule_value", required=True, help="Add one or more rules to your stream.")
+rule_source = parser.add_mutually_exclusive_group(required=True)
+rule_source.add_argument("-r", "--rule_value", help="Add one or more rules to your stream.")
+rule_source.add_argument("-f", "--rules_file", help="Bulk add rules from a JSON, NDJSON or CSV file ('-' for stdin).")
+parser.add_argument("--format", choices=['json', 'ndjson', 'csv'], help="Rules file format (default: from the file extension).")
+parser.add_argument("-w", "--workers", type=int, default=4, help="Max concurrent requests in bulk mode (default: 4).")
+parser.add_argument("--skip_invalid", action="store_true",
+                    help="Leave out rules that fail the offline linter instead of stopping before any request.")
 args = parser.parse_args()
 
 USERNAME = os.getenv("USERNAME")
@@ -24,12 +34,17 @@ domain = "https://gnip-api.twitter.com/rules"
 
 endpoint = f"{domain}/powertrack/accounts/{ACCOUNT_NAME}/publishers/twitter/{ENDPOINT_LABEL}.json"
 
+session = new_session(auth=(USERNAME, PASSWORD), pool_size=args.workers)
+
 
 def main():
+    if args.rules_file:
+        bulk_add(valid_rules(load_rules(args.rules_file, args.format), args.skip_invalid))
+        return
     rules = {"rules": [{"value": "rule1", "tag": "tag1"}]}
     rules.update(rules=[{"value": args.rule_value}])
     try:
-        response = requests.post(url=endpoint, auth=(USERNAME, PASSWORD), json=rules)
+        response = session.post(url=endpoint, auth=(USERNAME, PASSWORD), json=rules)
     except requests.exceptions.RequestException as e:
         print(e)
         sys.exit(120)
@@ -37,9 +52,24 @@ def main():
     print(f"Status: {response.status_code}\n", format_response(response))
 
 
+def bulk_add(rules):
+    batches = build_batches(rules)
+    print(f"Adding {len(rules)} rules in {len(batches)} requests...")
+    created = 0
+    failed = 0
+    for batch, response in send_batches(session, endpoint, batches, workers=args.workers):
+        batch_failed = report_failures(response, batch, "created")
+        created += len(batch) - batch_failed
+        failed += batch_failed
+
+    print(f"Done. Created: {created}, failed: {failed}")
+    if failed:
+        sys.exit(1)
+
+
 def add_rule(endpoint, rules):
     # The json param in the request sets the Content-Type in the header to 'application/json'
-    response = requests.post(url=endpoint, auth=(USERNAME, PASSWORD), json=rules)
+    response = session.post(url=endpoint, auth=(USERNAME, PASSWORD), json=rules)
 
     return response
 
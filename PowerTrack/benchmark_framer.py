@@ -0,0 +1,54 @@
+# Micro-benchmark for the stream framer - reports activities/sec for a range of chunksizes
+# using a synthetic stream (no credentials or network access required).
+import argparse
+import time
+
+from replay_server import synthetic_activities
+from stream_framer import ActivityFramer
+
+# Argparse for cli options. Run `python benchmark_framer.py -h` to see list of available arguments.
+parser = argparse.ArgumentParser()
+parser.add_argument("-c", "--chunksizes", nargs='+', type=int, default=[500, 1000, 10000, 65536, 262144],
+                    help="One or more chunksizes to benchmark (space delimited).")
+parser.add_argument("-n", "--activities", type=int, default=200000,
+                    help="Number of synthetic activities in the stream (default: 200000).")
+parser.add_argument("-k", "--keep_alive_every", type=int, default=50,
+                    help="Insert a keep-alive signal after every N activities (default: 50).")
+args = parser.parse_args()
+
+
+def main():
+    stream = build_stream(args.activities, args.keep_alive_every)
+    print(f"Synthetic stream: {args.activities} activities, {len(stream) / 1e6:.1f} MB\n")
+    print(f"{'chunksize':>10} {'activities/sec':>16} {'MB/sec':>10}")
+    for chunksize in args.chunksizes:
+        elapsed, count = run(stream, chunksize)
+        if count != args.activities:
+            print(f"Error: framed {count} activities, expected {args.activities}")
+        print(f"{chunksize:>10} {count / elapsed:>16,.0f} {len(stream) / elapsed / 1e6:>10.1f}")
+
+
+def build_stream(total, keep_alive_every):
+    lines = []
+    for i, activity in enumerate(synthetic_activities(total)):
+        lines.append(activity + b"\r\n")
+        if keep_alive_every and i % keep_alive_every == 0:
+            lines.append(b"\r\n")
+
+    return b"".join(lines)
+
+
+def run(stream, chunksize):
+    framer = ActivityFramer()
+    count = 0
+    view = memoryview(stream)
+    start = time.perf_counter()
+    for offset in range(0, len(stream), chunksize):
+        count += len(framer.feed(view[offset:offset + chunksize]))
+    elapsed = time.perf_counter() - start
+
+    return elapsed, count
+
+
+if __name__ == '__main__':
+    main()
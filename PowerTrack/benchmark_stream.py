@@ -0,0 +1,88 @@
+# End-to-end stream benchmark - runs `get_stream.py` against a local replay server and reports
+# the highest sustained activities/sec and how long the consumer takes to reconnect after a drop.
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from replay_server import ReplayServer, load_activities, synthetic_activities
+
+# Argparse for cli options. Run `python benchmark_stream.py -h` to see list of available arguments.
+parser = argparse.ArgumentParser()
+parser.add_argument("-f", "--file", help="NDJSON or NDJSON.gz file of activities to replay (default: synthetic).")
+parser.add_argument("-s", "--synthetic", type=int, default=200000,
+                    help="Number of synthetic activities when no file is given (default: 200000).")
+parser.add_argument("-d", "--duration", type=int, default=20, help="Seconds to run the benchmark (default: 20).")
+parser.add_argument("--rate", type=int, default=0,
+                    help="Replay rate in activities/sec, 0 for as fast as possible (default: 0).")
+parser.add_argument("--disconnect_every", type=int, default=100000,
+                    help="Drop the connection after this many activities, 0 to never drop (default: 100000).")
+parser.add_argument("consumer_args", nargs=argparse.REMAINDER,
+                    help="Extra arguments for get_stream.py, after '--' (e.g., -- -w 4 --worker_type process).")
+args = parser.parse_args()
+
+
+def main():
+    if args.file:
+        activities = load_activities(args.file)
+    else:
+        activities = synthetic_activities(args.synthetic)
+    server = ReplayServer(activities, port=0, rate=args.rate, loop=True,
+                          disconnect_every=args.disconnect_every).start()
+    extra = [arg for arg in args.consumer_args if arg != "--"]
+    # Duplicates are expected (the replay loops), so dedup is off unless asked for. The injected drops
+    # come seconds apart, so every session counts as healthy to measure the reconnect itself.
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "get_stream.py"),
+               "--endpoint", f"http://127.0.0.1:{server.port}/stream", "--stats_interval", "1",
+               "--dedup", "none", "--healthy_session", "0"] + extra
+    print(f"Replaying {len(activities)} activities for {args.duration}s: {' '.join(command[1:])}\n")
+    consumer = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    samples = []
+    reader = threading.Thread(target=read_stats, args=(consumer.stderr, samples), daemon=True)
+    reader.start()
+    time.sleep(args.duration)
+    consumer.terminate()
+    consumer.wait()
+    server.stop()
+    report(samples, server)
+
+
+def read_stats(stream, samples):
+    for line in stream:
+        try:
+            stats = json.loads(line)
+        except ValueError:
+            continue  # Connection messages
+        samples.append((stats["time"], stats["written"], stats["dropped"]))
+
+
+def report(samples, server):
+    # Throughput of the whole pipeline (activities written), one rate per stats interval
+    rates = [(written - prev_written) / (now - prev_time)
+             for (prev_time, prev_written, _), (now, written, _) in zip(samples, samples[1:]) if now > prev_time]
+    # Ignore the first interval (connection setup)
+    rates = rates[1:] or rates
+    if not rates:
+        print("Error: no stats received from get_stream.py")
+        return
+    print(f"Activities written:      {samples[-1][1]:,}")
+    print(f"Activities dropped:      {samples[-1][2]:,}")
+    print(f"Mean activities/sec:     {statistics.mean(rates):,.0f}")
+    print(f"Median activities/sec:   {statistics.median(rates):,.0f}")
+    # Best 5 consecutive intervals - a single spike isn't "sustained"
+    window = min(5, len(rates))
+    sustained = max(statistics.mean(rates[i:i + window]) for i in range(len(rates) - window + 1))
+    label = f"Peak sustained ({window}s):"
+    print(f"{label:<25}{sustained:,.0f}")
+    print(f"Connections:             {server.connections}")
+    if server.reconnect_times:
+        print(f"Reconnect time (mean):   {statistics.mean(server.reconnect_times):.3f}s")
+        print(f"Reconnect time (max):    {max(server.reconnect_times):.3f}s")
+
+
+if __name__ == '__main__':
+    main()
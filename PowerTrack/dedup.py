@@ -0,0 +1,82 @@
+# Fixed-memory duplicate filters keyed on Tweet ID.
+# Used to drop the overlap replayed by `backfillMinutes` after a reconnect.
+import hashlib
+import math
+from collections import OrderedDict
+
+
+class LRUIdSet:
+    """
+    Exact filter that remembers the most recently seen `capacity` IDs.
+    """
+
+    def __init__(self, capacity=500000):
+        self.capacity = capacity
+        self.ids = OrderedDict()
+
+    def seen(self, tweet_id):
+        # Returns True if the ID was already seen, otherwise records it
+        ids = self.ids
+        if tweet_id in ids:
+            ids.move_to_end(tweet_id)
+            return True
+        ids[tweet_id] = None
+        if len(ids) > self.capacity:
+            ids.popitem(last=False)
+
+        return False
+
+
+class BloomFilter:
+    """
+    Probabilistic filter - a fraction (`error_rate`) of new IDs will be reported as duplicates,
+    in exchange for a few bits of memory per ID. Two generations of `capacity / 2` IDs are kept
+    and the oldest is discarded when the newest fills, so memory stays fixed on an endless stream.
+    """
+
+    def __init__(self, capacity=5000000, error_rate=0.001):
+        self.generation_size = max(1, capacity // 2)
+        # Each ID is checked against two generations, so split the error budget between them
+        rate = error_rate / 2
+        self.num_bits = int(math.ceil(-self.generation_size * math.log(rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, int(round(self.num_bits / self.generation_size * math.log(2))))
+        self.current = bytearray((self.num_bits + 7) // 8)
+        self.previous = bytearray(len(self.current))
+        self.count = 0
+
+    def positions(self, tweet_id):
+        if isinstance(tweet_id, str):
+            tweet_id = tweet_id.encode("utf-8")
+        digest = hashlib.blake2b(tweet_id, digest_size=16).digest()
+        # Double hashing: derive all k positions from two 64-bit hashes
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        num_bits = self.num_bits
+
+        return [(h1 + i * h2) % num_bits for i in range(self.num_hashes)]
+
+    def seen(self, tweet_id):
+        positions = self.positions(tweet_id)
+        current = self.current
+        if all(current[p >> 3] & (1 << (p & 7)) for p in positions):
+            return True
+        previous = self.previous
+        if all(previous[p >> 3] & (1 << (p & 7)) for p in positions):
+            return True
+        for p in positions:
+            current[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+        if self.count >= self.generation_size:
+            self.previous = current
+            self.current = bytearray(len(current))
+            self.count = 0
+
+        return False
+
+
+def build_filter(kind, capacity, error_rate):
+    if kind == "lru":
+        return LRUIdSet(capacity)
+    elif kind == "bloom":
+        return BloomFilter(capacity, error_rate)
+    return None
@@ -2,18 +2,29 @@ import argparse
 import base64
 import json
 import os
+import re
 import ssl
 import sys
 import zlib
 
 import requests
 from dotenv import load_dotenv
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))  # For gnip_client.py
+from gnip_client import new_session
+from rules import RuleSnapshot, build_batches, report_failures, send_batches
 load_dotenv(verbose=True)  # Throws error if it can't find .env file
 
 # Argparse for cli options. Run `python engagement_totals.py -h` to see list of available arguments.
 parser = argparse.ArgumentParser()
-parser.add_argument("-i", "--ids", nargs='+', required=True, help="Delete one or more rules by ID.")
+parser.add_argument("-i", "--ids", nargs='+', help="Delete one or more rules by ID.")
+parser.add_argument("-f", "--ids_file", help="Delete rules by ID, read from a file (one ID per line).")
+parser.add_argument("-t", "--tags", nargs='+', help="Delete every rule with one of these tags.")
+parser.add_argument("-v", "--value_regex", help="Delete every rule whose value matches this regular expression.")
+parser.add_argument("-w", "--workers", type=int, default=4, help="Max concurrent requests (default: 4).")
+parser.add_argument("--dry_run", action="store_true", help="Print the matching rules without deleting them.")
 args = parser.parse_args()
+if not (args.ids or args.ids_file or args.tags or args.value_regex):
+    parser.error("pass at least one of -i, -f, -t or -v")
 
 USERNAME = os.getenv("USERNAME")
 PASSWORD = os.getenv("PASSWORD")
@@ -22,13 +33,36 @@ ENDPOINT_LABEL = os.getenv("POWERTRACK_LABEL")
 
 domain = "https://gnip-api.twitter.com/rules"
 
-endpoint = f"{domain}/powertrack/accounts/{ACCOUNT_NAME}/publishers/twitter/{ENDPOINT_LABEL}.json?_method=delete"
+rules_endpoint = f"{domain}/powertrack/accounts/{ACCOUNT_NAME}/publishers/twitter/{ENDPOINT_LABEL}.json"
+endpoint = f"{rules_endpoint}?_method=delete"
+
+session = new_session(auth=(USERNAME, PASSWORD), pool_size=args.workers)
 
 
 def main():
-    rule_ids = {"rule_ids": args.ids}
+    if args.ids and not (args.ids_file or args.tags or args.value_regex or args.dry_run):
+        delete_by_ids(args.ids)
+        return
+
+    rule_ids = select_rule_ids(session)
+    print(f"Matched {len(rule_ids)} rules.")
+    if args.dry_run or not rule_ids:
+        return
+
+    batches = build_batches(rule_ids, key="rule_ids")
+    print(f"Deleting {len(rule_ids)} rules in {len(batches)} requests...")
+    failed = 0
+    for batch, response in send_batches(session, endpoint, batches, key="rule_ids", workers=args.workers):
+        failed += report_failures(response, batch, "deleted")
+    print(f"Done. Deleted: {len(rule_ids) - failed}, failed: {failed}")
+    if failed:
+        sys.exit(1)
+
+
+def delete_by_ids(ids):
+    rule_ids = {"rule_ids": ids}
     try:
-        response = requests.post(url=endpoint, auth=(USERNAME, PASSWORD), json=rule_ids)
+        response = session.post(url=endpoint, auth=(USERNAME, PASSWORD), json=rule_ids)
     except requests.exceptions.RequestException as e:
         print(e)
         sys.exit(120)
@@ -36,6 +70,29 @@ def main():
     print(f"Status: {response.status_code}\n", format_response(response))
 
 
+def select_rule_ids(session):
+    rule_ids = set()
+    if args.ids:
+        rule_ids.update(int(rule_id) for rule_id in args.ids)
+    if args.ids_file:
+        with open(args.ids_file, "r") as read_file:
+            rule_ids.update(int(line) for line in read_file if line.strip())
+    if args.tags or args.value_regex:
+        # Tag and pattern selection need the live rule list (fetched once)
+        try:
+            snapshot = RuleSnapshot.fetch(session, rules_endpoint)
+        except requests.exceptions.RequestException as e:
+            print(e)
+            sys.exit(120)
+        for tag in args.tags or []:
+            rule_ids.update(rule["id"] for rule in snapshot.by_tag.get(tag, {}).values())
+        if args.value_regex:
+            pattern = re.compile(args.value_regex)
+            rule_ids.update(rule["id"] for rule in snapshot.rules() if pattern.search(rule["value"]))
+
+    return sorted(rule_ids)
+
+
 def format_response(response):
     parsed = json.loads(response.text)
     pretty_print = json.dumps(parsed, indent=2, sort_keys=True)
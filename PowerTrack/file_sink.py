@@ -0,0 +1,101 @@
+# Writes stream activities as NDJSON into time-rotated, compressed files.
+# Each file is written as '<name>.part' and only renamed to its final name once it has been
+# flushed and fsynced, so anything without the '.part' suffix is complete.
+import os
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+EXTENSIONS = {"gzip": ".ndjson.gz", "zstd": ".ndjson.zst", "none": ".ndjson"}
+
+
+class RotatingFileSink:
+    """
+    Buffers activities in memory and compresses them in large blocks, so there is one
+    compressor call and one write syscall per `buffer_size` bytes rather than per activity.
+    """
+
+    def __init__(self, output_dir, prefix="powertrack", rotate_minutes=60, compression="gzip",
+                 level=6, buffer_size=1 << 20):
+        if compression == "zstd" and zstandard is None:
+            raise RuntimeError("zstd compression requires the 'zstandard' package (pip install zstandard)")
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.period = rotate_minutes * 60
+        self.compression = compression
+        self.level = level
+        self.buffer_size = buffer_size
+        self.buffer = bytearray()
+        self.file = None
+        self.bucket = None
+        self.files_written = 0
+        os.makedirs(output_dir, exist_ok=True)
+
+    def write(self, activity):
+        bucket = int(time.time() // self.period)
+        if bucket != self.bucket:
+            self.rotate(bucket)
+        buffer = self.buffer
+        buffer += activity
+        buffer += b"\n"
+        if len(buffer) >= self.buffer_size:
+            self.flush_buffer()
+
+    def rotate(self, bucket):
+        if self.file is not None:
+            self.close()
+        started = time.strftime("%Y%m%d-%H%M", time.gmtime(bucket * self.period))
+        self.path = os.path.join(self.output_dir, f"{self.prefix}-{started}{EXTENSIONS[self.compression]}")
+        # Never clobber a finished (or crashed, partial) file when restarting within the same period
+        suffix = 1
+        final_path = self.path
+        while os.path.exists(final_path) or os.path.exists(f"{final_path}.part"):
+            final_path = self.path.replace(f"-{started}", f"-{started}-{suffix}")
+            suffix += 1
+        self.path = final_path
+        self.file = open(f"{self.path}.part", "wb", buffering=0)
+        self.compressor = new_compressor(self.compression, self.level)
+        self.bucket = bucket
+
+    def flush_buffer(self):
+        if not self.buffer:
+            return
+        data = bytes(self.buffer) if self.compressor is None else self.compressor.compress(self.buffer)
+        self.buffer.clear()
+        if data:
+            self.file.write(data)
+
+    def close(self):
+        if self.file is None:
+            return
+        self.flush_buffer()
+        if self.compressor is not None:
+            self.file.write(self.compressor.flush())
+        os.fsync(self.file.fileno())
+        self.file.close()
+        os.replace(f"{self.path}.part", self.path)
+        fsync_dir(self.output_dir)
+        self.file = None
+        self.bucket = None
+        self.files_written += 1
+
+
+def new_compressor(compression, level):
+    if compression == "gzip":
+        return zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 writes a gzip header/trailer
+    elif compression == "zstd":
+        return zstandard.ZstdCompressor(level=level).compressobj()
+    return None
+
+
+def fsync_dir(path):
+    # Makes the rename itself durable
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
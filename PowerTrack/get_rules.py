@@ -4,6 +4,8 @@ import sys
 
 import requests
 from dotenv import load_dotenv
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))  # For gnip_client.py
+from gnip_client import new_session
 load_dotenv(verbose=True)  # Throws error if it can't find .env file
 
 USERNAME = os.getenv("USERNAME")
@@ -15,10 +17,12 @@ domain = "https://gnip-api.twitter.com/rules"
 
 endpoint = f"{domain}/powertrack/accounts/{ACCOUNT_NAME}/publishers/twitter/{ENDPOINT_LABEL}.json"
 
+session = new_session()
+
 
 def main():
     try:
-        response = requests.get(url=endpoint, auth=(USERNAME, PASSWORD))
+        response = session.get(url=endpoint, auth=(USERNAME, PASSWORD))
     except requests.exceptions.RequestException as e:
         print(e)
         sys.exit(120)
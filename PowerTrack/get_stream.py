@@ -1,17 +1,70 @@
 
 import argparse
 import json
+import math
 import os
 import ssl
 import sys
+import threading
+import time
+import traceback
 
 import requests
+import urllib3
 from dotenv import load_dotenv
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))  # For gnip_client.py
+from gnip_client import new_session
+from dedup import build_filter
+from file_sink import RotatingFileSink
+from stream_framer import ActivityFramer
+from stream_metrics import ConnectionStats, MetricsReporter
+from stream_pipeline import StreamPipeline, decode_activity
+from tag_router import TagRouter, scan_activity
 load_dotenv(verbose=True)  # Throws error if it can't find .env file
 
 # Argparse for cli options. Run `python engagement_totals.py -h` to see list of available arguments.
 parser = argparse.ArgumentParser()
 parser.add_argument("-c", "--chunksize", type=int, help="Overrides default chunksize of '10000'.")
+parser.add_argument("-w", "--workers", type=int, default=2, help="Number of decoder workers (default: 2).")
+parser.add_argument("--worker_type", choices=['thread', 'process'], default="thread",
+                    help="Run decoder workers as threads or processes (default: thread).")
+parser.add_argument("-q", "--queue_size", type=int, default=1000,
+                    help="Max number of chunks buffered between the reader and the decoders (default: 1000).")
+parser.add_argument("--on_full", choices=['drop', 'block'], default="drop",
+                    help="Drop activities or block the socket reader when the queue is full (default: drop).")
+parser.add_argument("--stats_interval", type=int, default=30,
+                    help="Seconds between pipeline stats written to stderr, 0 to disable (default: 30).")
+parser.add_argument("-o", "--output_dir", help="Write NDJSON files to this directory instead of stdout.")
+parser.add_argument("--rotate_minutes", type=int, default=60,
+                    help="Start a new output file every N minutes (default: 60).")
+parser.add_argument("--compression", choices=['gzip', 'zstd', 'none'], default="gzip",
+                    help="Compression for output files (default: gzip). zstd requires the 'zstandard' package.")
+parser.add_argument("--compression_level", type=int, default=6, help="Compression level (default: 6).")
+parser.add_argument("--write_buffer", type=int, default=4, help="Output write buffer in MB (default: 4).")
+parser.add_argument("-b", "--backfill", type=int, default=0,
+                    help="Max backfillMinutes (1-5) to request when reconnecting after an outage. "
+                         "Requires Backfill to be enabled on your stream (default: 0, disabled).")
+parser.add_argument("--dedup", choices=['lru', 'bloom', 'none'], default="lru",
+                    help="Filter used to drop duplicate Tweet IDs replayed by backfill (default: lru).")
+parser.add_argument("--dedup_size", type=int, default=500000,
+                    help="Number of recent Tweet IDs the duplicate filter remembers (default: 500000).")
+parser.add_argument("--dedup_error_rate", type=float, default=0.001,
+                    help="False-positive rate for the bloom duplicate filter (default: 0.001).")
+parser.add_argument("-p", "--partitions", type=int, default=0,
+                    help="Number of partitions to connect to for a partitioned stream (default: 0, unpartitioned).")
+parser.add_argument("-r", "--redundant", type=int, default=0,
+                    help="Extra redundant connections per partition, merged and deduplicated by Tweet ID (default: 0).")
+parser.add_argument("--metrics_file", help="Also write stats in Prometheus text format to this file "
+                                            "(for the node_exporter textfile collector).")
+parser.add_argument("--metrics_port", type=int, help="Serve stats in Prometheus format on http://127.0.0.1:PORT/metrics.")
+parser.add_argument("--stall_timeout", type=int, default=45,
+                    help="Reconnect if no data or keep-alive arrives for this many seconds (default: 45).")
+parser.add_argument("--healthy_session", type=int, default=60,
+                    help="Seconds a connection must stay up before a disconnect resets the backoff and "
+                         "reconnects immediately (default: 60).")
+parser.add_argument("--route_by_tag", action="store_true",
+                    help="Write activities to one subdirectory of --output_dir per matching rule tag.")
+parser.add_argument("-e", "--endpoint", help="Overrides the stream URL built from '.env' (e.g., a local replay_server.py).")
 args = parser.parse_args()
 
 USERNAME = os.getenv("USERNAME")
@@ -21,7 +74,7 @@ ENDPOINT_LABEL = os.getenv("POWERTRACK_LABEL")
 
 domain = "https://gnip-stream.twitter.com/stream"
 
-endpoint = f"{domain}/powertrack/accounts/{ACCOUNT_NAME}/publishers/twitter/{ENDPOINT_LABEL}.json"
+endpoint = args.endpoint or f"{domain}/powertrack/accounts/{ACCOUNT_NAME}/publishers/twitter/{ENDPOINT_LABEL}.json"
 
 headers = {
     'connection': "keep-alive",
@@ -30,30 +83,160 @@ headers = {
     'gnipkeepalive': '30',
 }
 
+MAX_BACKOFF = 320
+MAX_BACKFILL = 5  # Upper limit on backfillMinutes enforced by the API
+
+# One pooled connection per stream connection, with no retries - consume() handles reconnects
+session = new_session(pool_size=max(args.partitions, 1) * (args.redundant + 1), retries=0)
+
 
 def main():
     if args.chunksize:
         chunksize = args.chunksize
     else:
         chunksize = 10000
+    sink = None
+    write = write_activity
+    decoder = decode_activity
+    if args.route_by_tag and not args.output_dir:
+        parser.error("--route_by_tag requires --output_dir")
+    if args.output_dir:
+        sink_options = dict(rotate_minutes=args.rotate_minutes, compression=args.compression,
+                            level=args.compression_level, buffer_size=args.write_buffer << 20)
+        if args.route_by_tag:
+            # Routing only needs the ID and tags, so skip the full JSON parse of every activity
+            sink = TagRouter(args.output_dir, **sink_options)
+            decoder = scan_activity
+        else:
+            sink = RotatingFileSink(args.output_dir, **sink_options)
+        write = sink.write
+    dedup = build_filter(args.dedup, args.dedup_size, args.dedup_error_rate)
+    pipeline = StreamPipeline(write, workers=args.workers, worker_type=args.worker_type,
+                              queue_size=args.queue_size, on_full=args.on_full, decoder=decoder, dedup=dedup)
+    connections = build_connections(args.partitions, args.redundant)
+    pipeline.start()
+    reporter = MetricsReporter(pipeline, [stats for _, stats in connections], interval=args.stats_interval,
+                               textfile=args.metrics_file, port=args.metrics_port)
+    reporter.start()
+    # Each connection gets its own reader thread; all of them feed the same pipeline
+    reader_failed = threading.Event()
+    for params, stats in connections:
+        reader = threading.Thread(target=read_connection,
+                                  args=(endpoint, chunksize, pipeline, params, stats, reader_failed), daemon=True)
+        reader.start()
+    try:
+        while not reader_failed.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    # Drain the pipeline and finalize the current output file
+    pipeline.stop()
+    if sink is not None:
+        sink.close()
+    if reader_failed.is_set():
+        sys.exit(1)
+
+
+def build_connections(partitions, redundant):
+    connections = []
+    for partition in range(1, partitions + 1) if partitions else [None]:
+        for copy in range(redundant + 1):
+            params = {}
+            name = "stream"
+            if partition is not None:
+                params["partition"] = partition
+                name = f"partition-{partition}"
+            if copy:
+                name = f"{name}-redundant-{copy}"
+            connections.append((params, ConnectionStats(name)))
+
+    return connections
+
+
+# Runs one connection's reconnect loop; an unexpected error stops the script instead of silently
+# leaving the connection dead
+def read_connection(endpoint, chunksize, pipeline, params, stats, reader_failed):
+    try:
+        consume(endpoint, chunksize, pipeline, params, stats)
+    except Exception:
+        sys.stderr.write(f"{stats.name}: reader failed, exiting\n{traceback.format_exc()}")
+        reader_failed.set()
+
+
+# Reconnect logic with exponential backoff, reset after every healthy session
+def consume(endpoint, chunksize, pipeline, params, stats):
     timeout = 0
-    # Reconnect logic with exponential backoff
+    last_data = None
     while True:
-        get_stream(endpoint, chunksize)
-        time.sleep(2 ** timeout)
+        backfill = backfill_minutes(last_data)
+        connected = time.time()
+        received = get_stream(endpoint, chunksize, pipeline, params, stats, backfill)
+        last_data = received or last_data
+        if received is not None and time.time() - connected >= args.healthy_session:
+            # Data was flowing for a while, so this was a routine disconnect - reconnect straight away.
+            # Shorter sessions keep backing off, so a stream that accepts then drops isn't hammered.
+            timeout = 0
+            continue
+        time.sleep(min(2 ** timeout, MAX_BACKOFF))
         timeout += 1
 
 
-def get_stream(endpoint, chunksize):
-    response = requests.get(url=endpoint, auth=(USERNAME, PASSWORD), stream=True, headers=headers)
-    for chunk in response.iter_content(chunksize, decode_unicode=True):  # Content gets decoded
-        if "\n" or "\r" in chunk:  # Handles keep-alive new lines
-            print(chunk)  # Prints keep-alive signal to stdout
+# Socket read loop - only frames activities and hands them to the pipeline, never decodes or prints.
+# Returns the time data was last received, or None if nothing arrived
+def get_stream(endpoint, chunksize, pipeline, params, stats, backfill=0):
+    params = dict(params)
+    if backfill:
+        params["backfillMinutes"] = backfill
+    last_data = None
+    try:
+        # The read timeout fires when the socket goes quiet, i.e. the 30s keep-alive was missed
+        response = session.get(url=endpoint, auth=(USERNAME, PASSWORD), stream=True, headers=headers,
+                                params=params, timeout=(10, args.stall_timeout))
+        if response.status_code != 200:
+            sys.stderr.write(f"{stats.name}: stream returned status {response.status_code}: {response.text}\n")
+            return None
+        sys.stderr.write(f"{stats.name}: connected (backfillMinutes: {backfill})\n")
+        stats.connected()
+        framer = ActivityFramer()
+        # Chunks are raw (gunzipped) bytes; the framer only hands back complete activities
+        for chunk in response.iter_content(chunksize):
+            last_data = time.time()
+            keep_alives = framer.keep_alives
+            batch = framer.feed(chunk)
+            stats.record(batch, len(chunk), framer.keep_alives - keep_alives)
+            pipeline.submit(batch)
+    except requests.exceptions.RequestException as e:
+        if is_stall(e):
+            stats.stalled()
+            sys.stderr.write(f"{stats.name}: stalled, no data for {args.stall_timeout}s - reconnecting\n")
         else:
-            try:
-                print(json.loads(chunk))
-            except ValueError:
-                sys.stderr.write(f"Error processing JSON: {ValueError} {chunk}\n")
+            sys.stderr.write(f"{stats.name}: disconnected: {e}\n")
+
+    return last_data
+
+
+# A read timeout - while waiting for the response (ReadTimeout) or mid-stream, where requests wraps
+# urllib3's ReadTimeoutError in a ConnectionError
+def is_stall(e):
+    if isinstance(e, requests.exceptions.ReadTimeout):
+        return True
+
+    return isinstance(e, requests.exceptions.ConnectionError) and any(
+        isinstance(arg, urllib3.exceptions.ReadTimeoutError) for arg in e.args)
+
+
+# Covers the time since data was last received, rounded up to whole minutes
+def backfill_minutes(last_data):
+    if not args.backfill or last_data is None:
+        return 0
+    outage = time.time() - last_data
+
+    return max(1, min(args.backfill, MAX_BACKFILL, math.ceil(outage / 60)))
+
+
+# Runs on the pipeline's single writer thread
+def write_activity(activity):
+    sys.stdout.buffer.write(activity + b"\n")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,190 @@
+# Local stand-in for the PowerTrack stream, for load testing `get_stream.py` without using live quota.
+# Replays a recorded NDJSON(.gz) file (or synthetic activities) over chunked, gzip-encoded HTTP with
+# '\r\n' framing and keep-alive signals, and can drop connections to exercise the reconnect logic.
+import argparse
+import gzip
+import json
+import socket
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Argparse for cli options. Run `python replay_server.py -h` to see list of available arguments.
+parser = argparse.ArgumentParser()
+parser.add_argument("-f", "--file", help="NDJSON or NDJSON.gz file of activities to replay.")
+parser.add_argument("-s", "--synthetic", type=int, default=100000,
+                    help="Number of synthetic activities to replay when no file is given (default: 100000).")
+parser.add_argument("--port", type=int, default=8080, help="Port to listen on (default: 8080).")
+parser.add_argument("--rate", type=int, default=0,
+                    help="Activities per second per connection, 0 for as fast as possible (default: 0).")
+parser.add_argument("--loop", action="store_true", help="Start over at the end of the file instead of idling.")
+parser.add_argument("--disconnect_every", type=int, default=0,
+                    help="Drop each connection after sending this many activities (default: 0, never).")
+parser.add_argument("--keep_alive", type=int, default=30,
+                    help="Seconds between keep-alive signals when idle (default: 30).")
+
+BATCH_BYTES = 64 * 1024  # Activities are compressed and sent in batches of about this size
+
+
+def synthetic_activities(total, start_id=1150000000000000000):
+    template = {
+        "id_str": "0",
+        "text": "Sample activity text with a bit of unicode – \U0001F426 #python",
+        "user": {"id_str": "12", "screen_name": "TwitterDev", "followers_count": 512000},
+        "entities": {"hashtags": [{"text": "python", "indices": [52, 59]}], "urls": []},
+        "matching_rules": [{"tag": "tag1", "id": 1154088735153123328}],
+    }
+    activities = []
+    for i in range(total):
+        template["id_str"] = str(start_id + i)
+        activities.append(json.dumps(template).encode("utf-8"))
+
+    return activities
+
+
+def load_activities(path):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as infile:
+        return [line.rstrip(b"\r\n") for line in infile if line.strip()]
+
+
+class ReplayServer:
+    """
+    Serves the same list of activities to every connection. Records when each connection
+    starts and is dropped, so the time a client takes to reconnect can be measured.
+    """
+
+    def __init__(self, activities, port=8080, rate=0, loop=False, disconnect_every=0, keep_alive=30):
+        self.activities = activities
+        self.rate = rate
+        self.loop = loop
+        self.disconnect_every = disconnect_every
+        self.keep_alive = keep_alive
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.activities_sent = 0
+        self.reconnect_times = []
+        self.last_disconnect = None
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self.handler())
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+
+    def handler(self):
+        server = self
+
+        class StreamHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server.connected()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Encoding", "gzip")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    server.replay(self)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # Client went away
+
+            def log_message(self, format, *args):
+                pass
+
+        return StreamHandler
+
+    def connected(self):
+        with self.lock:
+            self.connections += 1
+            if self.last_disconnect is not None:
+                self.reconnect_times.append(time.monotonic() - self.last_disconnect)
+                self.last_disconnect = None
+
+    def replay(self, handler):
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        started = time.monotonic()
+        sent = 0
+        batch = []
+        batch_bytes = 0
+        position = 0
+        while True:
+            if position == len(self.activities):
+                if not self.loop:
+                    if batch:
+                        # Send what's left of the file before going idle
+                        send_chunk(handler, compressor, batch)
+                        with self.lock:
+                            self.activities_sent += len(batch)
+                        batch = []
+                        batch_bytes = 0
+                    # Out of data - behave like an idle stream and only send keep-alives
+                    time.sleep(self.keep_alive)
+                    send_chunk(handler, compressor, [b""])
+                    continue
+                position = 0
+            activity = self.activities[position]
+            position += 1
+            batch.append(activity)
+            batch_bytes += len(activity) + 2
+            sent += 1
+            disconnect = self.disconnect_every and sent % self.disconnect_every == 0
+            flush = batch_bytes >= BATCH_BYTES or disconnect
+            if self.rate:
+                # Whenever we're ahead of schedule, wait for it to catch up and send what we have
+                delay = sent / self.rate - (time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+                    flush = True
+            if flush:
+                send_chunk(handler, compressor, batch)
+                with self.lock:
+                    self.activities_sent += len(batch)
+                batch = []
+                batch_bytes = 0
+            if disconnect:
+                # Abort mid-stream without the terminating chunk, like a dropped connection
+                with self.lock:
+                    self.last_disconnect = time.monotonic()
+                handler.close_connection = True
+                handler.connection.shutdown(socket.SHUT_RDWR)
+                return
+
+    def serve(self):
+        self.httpd.serve_forever()
+
+    def start(self):
+        threading.Thread(target=self.serve, daemon=True).start()
+
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def send_chunk(handler, compressor, activities):
+    # Each activity (an empty one is a keep-alive) is terminated by '\r\n'
+    data = b"\r\n".join(activities) + b"\r\n"
+    payload = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    handler.wfile.write(b"%x\r\n%s\r\n" % (len(payload), payload))
+    handler.wfile.flush()
+
+
+def main():
+    args = parser.parse_args()
+    if args.file:
+        activities = load_activities(args.file)
+    else:
+        activities = synthetic_activities(args.synthetic)
+    server = ReplayServer(activities, port=args.port, rate=args.rate, loop=args.loop,
+                          disconnect_every=args.disconnect_every, keep_alive=args.keep_alive)
+    print(f"Replaying {len(activities)} activities on http://127.0.0.1:{server.port}/stream", file=sys.stderr)
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
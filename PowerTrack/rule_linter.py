@@ -0,0 +1,238 @@
+# Offline PowerTrack rule linter - catches malformed rules locally instead of failing a whole
+# batch with a 400 response. Checks length limits, quoting, parentheses, negation-only rules,
+# standalone-only operators and unknown operators.
+import argparse
+import re
+import sys
+
+from rules import load_rules
+
+# Argparse for cli options. Run `python rule_linter.py -h` to see list of available arguments.
+parser = argparse.ArgumentParser()
+rule_source = parser.add_mutually_exclusive_group(required=True)
+rule_source.add_argument("-r", "--rule_value", help="Lint a single rule value.")
+rule_source.add_argument("-f", "--rules_file", help="Lint a JSON, NDJSON or CSV rules file ('-' for stdin).")
+parser.add_argument("--format", choices=['json', 'ndjson', 'csv'], help="Rules file format (default: from the file extension).")
+
+MAX_RULE_LENGTH = 2048
+MAX_TAG_LENGTH = 255
+MAX_POSITIVE_CLAUSES = 30
+MAX_NEGATED_CLAUSES = 50
+
+OPERATORS = {
+    "from", "to", "retweets_of", "retweets_of_status_id", "in_reply_to_status_id", "url", "url_title",
+    "url_description", "url_contains", "lang", "sample", "bio", "bio_name", "bio_location", "place",
+    "place_country", "point_radius", "bounding_box", "profile_country", "profile_region",
+    "profile_locality", "profile_subregion", "profile_point_radius", "profile_bounding_box",
+    "followers_count", "statuses_count", "friends_count", "listed_count", "source", "contains",
+    "has", "is", "keyword",
+}
+HAS_VALUES = {"links", "media", "mentions", "hashtags", "geo", "profile_geo", "images", "videos", "symbols",
+              "lang"}
+IS_VALUES = {"retweet", "reply", "quote", "verified"}
+# These narrow a rule but can't be its only positive clauses
+NOT_STANDALONE = {"has", "is", "lang", "sample"}
+
+TOKEN = re.compile(r'''
+    (?P<space>\s+)
+  | (?P<open>\()
+  | (?P<close>\))
+  | (?P<negate>-(?=[^\s)]))
+  | (?P<phrase>"(?:[^"\\]|\\.)*"(?:~\d+)?)
+  | (?P<unclosed>"(?:[^"\\]|\\.)*$)
+  | (?P<geo>[a-z_]+:\[[^\]]*\])
+  | (?P<term>[^\s()"]+(?:"(?:[^"\\]|\\.)*")?)
+''', re.VERBOSE)
+# "name:" followed by "//" is a URL keyword (e.g. http://t.co/x), not an operator
+OPERATOR = re.compile(r"^([a-z_]+):(?!//)(.*)$")
+
+
+def tokenize(value):
+    tokens = []
+    for match in TOKEN.finditer(value):
+        kind = match.lastgroup
+        if kind == "geo":
+            kind = "term"  # e.g. point_radius:[lon lat radius] - spaces are part of the operand
+        if kind != "space":
+            tokens.append((kind, match.group()))
+
+    return tokens
+
+
+class RuleParser:
+    """
+    Recursive-descent parser for the rule grammar:
+        rule   := or_expr
+        or_expr  := and_expr ("OR" and_expr)*
+        and_expr := clause+
+        clause   := "-"? (term | phrase | "(" or_expr ")")
+    Collects errors instead of raising, and counts positive and negated clauses.
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+        self.errors = []
+        self.positive = 0
+        self.negated = 0
+        self.standalone = 0
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def next(self):
+        token = self.peek()
+        self.position += 1
+
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            self.errors.append("rule is empty")
+            return self.errors
+        self.or_expr(negated=False)
+        if self.position < len(self.tokens):
+            self.errors.append("unbalanced parentheses: unexpected ')'")
+
+        return self.errors
+
+    def or_expr(self, negated):
+        self.and_expr(negated)
+        while self.peek() == ("term", "OR"):
+            self.next()
+            if self.peek()[0] == "negate":
+                self.errors.append("negated clauses can't be combined with OR (e.g., 'apple OR -ipad')")
+            if self.peek()[0] in (None, "close") or self.peek() == ("term", "OR"):
+                self.errors.append("OR must be followed by a clause")
+                return
+            self.and_expr(negated)
+
+    def and_expr(self, negated):
+        kind, text = self.peek()
+        if kind in (None, "close") or (kind, text) == ("term", "OR"):
+            self.errors.append("OR must be preceded by a clause" if text == "OR" else "empty group '()'")
+            return
+        while True:
+            kind, text = self.peek()
+            if kind in (None, "close") or (kind, text) == ("term", "OR"):
+                return
+            self.clause(negated)
+
+    def clause(self, negated):
+        kind, text = self.next()
+        if kind == "negate":
+            if self.peek()[0] in (None, "negate", "close"):
+                self.errors.append("'-' must be followed by a clause")
+                return
+            self.clause(negated=True)
+            return
+        if kind == "open":
+            self.or_expr(negated)  # Everything inside a negated group is negated
+            if self.next()[0] != "close":
+                self.errors.append("unbalanced parentheses: missing ')'")
+            return
+        if kind == "close":
+            self.errors.append("unbalanced parentheses: unexpected ')'")
+            return
+        if kind == "unclosed":
+            self.errors.append(f"unbalanced quotes: {text}")
+            return
+        if negated:
+            self.negated += 1
+        else:
+            self.positive += 1
+        if kind == "term":
+            self.check_term(text, negated)
+        elif not negated:
+            self.standalone += 1
+
+    def check_term(self, text, negated):
+        if text in ("AND", "and", "or"):
+            self.errors.append(f"'{text}' is matched as a keyword - AND is implied by a space and OR must be uppercase")
+        operator = OPERATOR.match(text)
+        if operator is None:
+            if not negated:
+                self.standalone += 1
+            return
+        name, operand = operator.groups()
+        if name not in OPERATORS:
+            self.errors.append(f"unknown operator '{name}:'")
+        elif not operand:
+            self.errors.append(f"operator '{name}:' has no value")
+        elif name == "has" and operand not in HAS_VALUES:
+            self.errors.append(f"unknown operator 'has:{operand}'")
+        elif name == "is" and operand not in IS_VALUES:
+            self.errors.append(f"unknown operator 'is:{operand}'")
+        if name not in NOT_STANDALONE and not negated:
+            self.standalone += 1
+
+
+def lint_rule(value, tag=None):
+    # Returns a list of problems with the rule (empty if it looks valid)
+    errors = []
+    if len(value) > MAX_RULE_LENGTH:
+        errors.append(f"rule is {len(value)} characters (max {MAX_RULE_LENGTH})")
+    if tag is not None and len(tag) > MAX_TAG_LENGTH:
+        errors.append(f"tag is {len(tag)} characters (max {MAX_TAG_LENGTH})")
+    rule_parser = RuleParser(tokenize(value))
+    errors.extend(rule_parser.parse())
+    if rule_parser.positive == 0 and rule_parser.negated:
+        errors.append("rule only has negated clauses")
+    elif rule_parser.positive and rule_parser.standalone == 0:
+        errors.append("has:, is:, lang: and sample: can't be used without another operator or keyword")
+    if rule_parser.positive > MAX_POSITIVE_CLAUSES:
+        errors.append(f"rule has {rule_parser.positive} positive clauses (max {MAX_POSITIVE_CLAUSES})")
+    if rule_parser.negated > MAX_NEGATED_CLAUSES:
+        errors.append(f"rule has {rule_parser.negated} negated clauses (max {MAX_NEGATED_CLAUSES})")
+
+    return errors
+
+
+def lint_rules(rules):
+    # Returns (rule, errors) for every invalid rule
+    invalid = []
+    for rule in rules:
+        errors = lint_rule(rule["value"], rule.get("tag"))
+        if errors:
+            invalid.append((rule, errors))
+
+    return invalid
+
+
+def print_invalid(invalid):
+    for rule, errors in invalid:
+        print(f"Invalid rule: {rule['value']!r}")
+        for error in errors:
+            print(f"  - {error}")
+
+
+def valid_rules(rules, skip_invalid=False):
+    # Lint before any request is made - one malformed rule would otherwise fail its whole batch
+    invalid = lint_rules(rules)
+    if not invalid:
+        return rules
+    print_invalid(invalid)
+    if not skip_invalid:
+        print(f"{len(invalid)} invalid rules, no changes made. Fix them or pass --skip_invalid.")
+        sys.exit(1)
+    rejected = {id(rule) for rule, _ in invalid}
+    print(f"Skipping {len(invalid)} invalid rules.")
+
+    return [rule for rule in rules if id(rule) not in rejected]
+
+
+def main():
+    args = parser.parse_args()
+    if args.rule_value:
+        rules = [{"value": args.rule_value}]
+    else:
+        rules = load_rules(args.rules_file, args.format)
+    invalid = lint_rules(rules)
+    print_invalid(invalid)
+    print(f"{len(rules) - len(invalid)} of {len(rules)} rules passed.")
+    if invalid:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+# Helpers for bulk PowerTrack rule management - loading rule files, packing rules into
+# request-sized batches, and sending the batches concurrently over one pooled session.
+import csv
+import io
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# Rules API limits per request
+MAX_RULES_PER_REQUEST = 5000
+MAX_REQUEST_BYTES = 1000000
+
+
+def load_rules(path, file_format=None):
+    # Reads rules from a JSON, NDJSON or CSV file ('-' for stdin) into a list of {"value", "tag"} dicts
+    if file_format is None:
+        file_format = guess_format(path)
+    if path == "-":
+        text = sys.stdin.read()
+    else:
+        with open(path, "r", encoding="utf-8") as read_file:
+            text = read_file.read()
+
+    if file_format == "json":
+        parsed = json.loads(text)
+        items = parsed["rules"] if isinstance(parsed, dict) else parsed
+    elif file_format == "ndjson":
+        items = [json.loads(line) for line in text.splitlines() if line.strip()]
+    else:
+        items = read_csv(text)
+
+    return [normalize_rule(item) for item in items]
+
+
+def guess_format(path):
+    if path.endswith(".csv"):
+        return "csv"
+    elif path.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    return "json"
+
+
+def read_csv(text):
+    # Either a header row with 'value' (and optionally 'tag') columns, or bare value,tag rows
+    rows = list(csv.reader(io.StringIO(text)))
+    if rows and "value" in rows[0]:
+        header = rows.pop(0)
+        return [dict(zip(header, row)) for row in rows if row]
+
+    return [{"value": row[0], "tag": row[1] if len(row) > 1 else None} for row in rows if row]
+
+
+def normalize_rule(item):
+    if isinstance(item, str):
+        return {"value": item}
+    rule = {"value": item["value"]}
+    if item.get("tag"):
+        rule["tag"] = item["tag"]
+
+    return rule
+
+
+def build_batches(items, max_items=MAX_RULES_PER_REQUEST, max_bytes=MAX_REQUEST_BYTES, key="rules"):
+    # Packs items into batches that stay under both the per-request count and payload size limits
+    overhead = len(json.dumps({key: []}).encode("utf-8"))
+    batches = []
+    batch = []
+    size = overhead
+    for item in items:
+        item_size = len(json.dumps(item).encode("utf-8")) + 2  # Plus the ', ' separator
+        if batch and (len(batch) >= max_items or size + item_size > max_bytes):
+            batches.append(batch)
+            batch = []
+            size = overhead
+        batch.append(item)
+        size += item_size
+    if batch:
+        batches.append(batch)
+
+    return batches
+
+
+def send_batches(session, url, batches, key="rules", workers=4):
+    # Returns (batch, response) pairs in batch order; response is the exception if the request failed
+    def send(batch):
+        try:
+            return batch, session.post(url=url, json={key: batch})
+        except requests.exceptions.RequestException as e:
+            return batch, e
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(send, batches))
+
+
+def rule_failures(response, action="created"):
+    # Rules the API rejected, with the reason, from the 'detail' section of an add ('created')
+    # or delete ('deleted') response
+    try:
+        parsed = json.loads(response.text)
+    except ValueError:
+        return []
+
+    return [(item.get("rule"), item.get("message")) for item in parsed.get("detail", [])
+            if not item.get(action, True)]
+
+
+def report_failures(response, batch, action):
+    # Prints any failures and returns how many items in the batch failed
+    if isinstance(response, requests.exceptions.RequestException):
+        print(f"Request failed for {len(batch)} rules: {response}")
+        return len(batch)
+    failures = rule_failures(response, action)
+    if not response.ok and not failures:
+        print(f"Status: {response.status_code} for {len(batch)} rules\n", response.text)
+        return len(batch)
+    for rule, message in failures:
+        print(f"Rule not {action}: {json.dumps(rule)} - {message}")
+    if not response.ok:
+        # The API rejects the whole batch if any rule in it is invalid
+        print(f"Status: {response.status_code}, none of the {len(batch)} rules in the batch were {action}")
+        return len(batch)
+
+    return len(failures)
+
+
+def rule_key(rule):
+    # Rules are identified by value and tag - a changed tag is a delete plus an add
+    return rule["value"], rule.get("tag") or None
+
+
+class RuleSnapshot:
+    """
+    Local copy of a stream's live rules, indexed by (value, tag) and by tag, so a desired
+    rule set can be diffed against it with set lookups instead of one API call per rule.
+    """
+
+    def __init__(self, rules, fetched_at=None):
+        self.fetched_at = fetched_at or time.time()
+        self.by_key = {}
+        self.by_tag = defaultdict(dict)
+        for rule in rules:
+            self.add(rule)
+
+    def add(self, rule):
+        key = rule_key(rule)
+        self.by_key[key] = rule
+        self.by_tag[key[1]][key] = rule
+
+    def remove(self, key):
+        self.by_key.pop(key, None)
+        self.by_tag[key[1]].pop(key, None)
+
+    def rules(self):
+        return list(self.by_key.values())
+
+    def diff(self, desired):
+        # Returns (rules to add, live rules to delete)
+        desired_keys = {rule_key(rule): rule for rule in desired}
+        to_add = [rule for key, rule in desired_keys.items() if key not in self.by_key]
+        to_delete = [rule for key, rule in self.by_key.items() if key not in desired_keys]
+
+        return to_add, to_delete
+
+    @classmethod
+    def fetch(cls, session, url):
+        response = session.get(url=url)
+        response.raise_for_status()
+
+        return cls(json.loads(response.text)["rules"])
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as read_file:
+            cached = json.load(read_file)
+
+        return cls(cached["rules"], cached["fetched_at"])
+
+    def save(self, path):
+        # Write then rename so a crash never leaves a truncated snapshot
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as outfile:
+            json.dump({"fetched_at": self.fetched_at, "rules": self.rules()}, outfile)
+        os.replace(tmp_path, path)
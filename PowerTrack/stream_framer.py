@@ -0,0 +1,44 @@
+# Splits the raw PowerTrack byte stream into complete activities.
+# Activities are delimited by '\r\n' and keep-alive signals arrive as bare '\r\n' lines,
+# neither of which lines up with the chunk boundaries returned by `iter_content`.
+
+DELIMITER = b"\r\n"
+
+
+class ActivityFramer:
+    """
+    Buffers raw stream bytes and returns only complete activities.
+    Partial activities are held until the rest arrives in a later chunk.
+    """
+
+    def __init__(self, delimiter=DELIMITER):
+        self.delimiter = delimiter
+        self.buffer = bytearray()
+        self.keep_alives = 0
+
+    def feed(self, chunk):
+        buffer = self.buffer
+        buffer += chunk
+        delimiter = self.delimiter
+        step = len(delimiter)
+        activities = []
+        start = 0
+        # Slicing the memoryview copies each activity exactly once (into its bytes object)
+        with memoryview(buffer) as view:
+            while True:
+                end = buffer.find(delimiter, start)
+                if end == -1:
+                    break
+                if end == start:
+                    self.keep_alives += 1  # Blank line, no need to allocate anything
+                else:
+                    activities.append(bytes(view[start:end]))
+                start = end + step
+        # Drop consumed bytes so the buffer only ever holds one partial activity
+        if start:
+            del buffer[:start]
+
+        return activities
+
+    def pending(self):
+        return len(self.buffer)
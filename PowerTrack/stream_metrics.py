@@ -0,0 +1,204 @@
+# Throughput and health metrics for the PowerTrack stream consumer.
+# Per-connection counters are updated by the reader threads; `MetricsReporter` publishes them
+# (with the pipeline counters) as JSON lines on stderr, a Prometheus textfile and/or a local HTTP endpoint.
+import json
+import os
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TWITTER_EPOCH_MS = 1288834974657
+ID_STR = re.compile(rb'"id_str":\s*"(\d+)"')
+TEXTFILE_INTERVAL = 15  # Seconds between --metrics_file writes when stderr stats are off
+
+
+def tweet_time(activity):
+    # Tweet IDs are snowflakes - the creation time (ms) is encoded in the top bits,
+    # so lag can be measured without parsing the activity
+    match = ID_STR.search(activity)
+    if match is None:
+        return None
+
+    return ((int(match.group(1)) >> 22) + TWITTER_EPOCH_MS) / 1000
+
+
+class ConnectionStats:
+    """
+    Throughput, lag and keep-alive health for a single stream connection. Updated by the
+    connection's reader thread once per chunk and read by the reporting thread.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.activities = 0
+        self.bytes = 0
+        self.connects = 0
+        self.stalls = 0
+        self.keep_alives = 0
+        self.keep_alive_interval = None
+        self.last_keep_alive = None
+        self.last_data = None
+        self.last_activity = None
+        self.lag = None
+        self.window_start = time.time()
+        self.window_activities = 0
+        self.window_bytes = 0
+
+    def connected(self):
+        with self.lock:
+            self.connects += 1
+
+    def stalled(self):
+        with self.lock:
+            self.stalls += 1
+
+    def record(self, batch, nbytes, keep_alives=0):
+        now = time.time()
+        lag = None
+        if batch:
+            created = tweet_time(batch[-1])
+            if created is not None:
+                lag = now - created
+        with self.lock:
+            self.activities += len(batch)
+            self.bytes += nbytes
+            self.window_activities += len(batch)
+            self.window_bytes += nbytes
+            self.last_data = now
+            if batch:
+                self.last_activity = now
+            if lag is not None:
+                self.lag = lag
+            if keep_alives:
+                if self.last_keep_alive is not None:
+                    self.keep_alive_interval = (now - self.last_keep_alive) / keep_alives
+                self.last_keep_alive = now
+                self.keep_alives += keep_alives
+
+    def snapshot(self, reset=True):
+        # Rates cover the time since the previous resetting snapshot
+        now = time.time()
+        with self.lock:
+            elapsed = max(now - self.window_start, 1e-9)
+            snapshot = {
+                "connection": self.name,
+                "connects": self.connects,
+                "stalls": self.stalls,
+                "activities": self.activities,
+                "bytes": self.bytes,
+                "keep_alives": self.keep_alives,
+                "activities_per_sec": round(self.window_activities / elapsed, 1),
+                "bytes_per_sec": round(self.window_bytes / elapsed, 1),
+                "lag_seconds": rounded(self.lag),
+                "keep_alive_interval_seconds": rounded(self.keep_alive_interval),
+                "seconds_since_data": since(now, self.last_data),
+                "seconds_since_activity": since(now, self.last_activity),
+            }
+            if reset:
+                self.window_start = now
+                self.window_activities = 0
+                self.window_bytes = 0
+
+        return snapshot
+
+
+def since(now, then):
+    return None if then is None else rounded(now - then)
+
+
+def rounded(value):
+    return None if value is None else round(value, 3)
+
+
+class MetricsReporter:
+    """
+    Collects pipeline and connection stats every `interval` seconds and publishes them.
+    """
+
+    def __init__(self, pipeline, connections, interval=30, stream=sys.stderr, textfile=None, port=None):
+        self.pipeline = pipeline
+        self.connections = connections
+        self.interval = interval
+        self.stream = stream
+        self.textfile = textfile
+        self.port = port
+
+    def collect(self, reset=True):
+        stats = self.pipeline.stats()
+        stats["time"] = round(time.time(), 3)
+        stats["connections"] = [connection.snapshot(reset) for connection in self.connections]
+
+        return stats
+
+    def start(self):
+        if self.port:
+            serve_metrics(self.port, lambda: render_prometheus(self.collect(reset=False)))
+        if self.interval or self.textfile:
+            threading.Thread(target=self.loop, daemon=True).start()
+
+    def loop(self):
+        while True:
+            time.sleep(self.interval or TEXTFILE_INTERVAL)
+            stats = self.collect()
+            if self.stream is not None and self.interval:
+                self.stream.write(json.dumps(stats) + "\n")
+                self.stream.flush()
+            if self.textfile:
+                write_textfile(self.textfile, render_prometheus(stats))
+
+
+# Connection stats exported as Prometheus counters; everything else numeric is a gauge
+COUNTERS = {"connects", "stalls", "activities", "bytes", "keep_alives"}
+PIPELINE_COUNTERS = {"submitted", "written", "decode_errors", "duplicates", "dropped", "stalls", "decoded"}
+
+
+def render_prometheus(stats):
+    lines = []
+    for key, value in stats.items():
+        if key in ("connections", "time") or value is None:
+            continue
+        name = f"powertrack_pipeline_{key}"
+        if key in PIPELINE_COUNTERS:
+            name += "_total"
+        lines.append(f"{name} {value}")
+    for connection in stats["connections"]:
+        label = f'{{connection="{connection["connection"]}"}}'
+        for key, value in connection.items():
+            if key == "connection" or value is None:
+                continue
+            name = f"powertrack_connection_{key}"
+            if key in COUNTERS:
+                name += "_total"
+            lines.append(f"{name}{label} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path, text):
+    # Write then rename so the node_exporter textfile collector never reads a partial file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as outfile:
+        outfile.write(text)
+    os.replace(tmp_path, path)
+
+
+def serve_metrics(port, render):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Keep scrapes out of stderr
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
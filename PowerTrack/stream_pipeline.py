@@ -0,0 +1,144 @@
+# Reader -> decoder pool -> writer pipeline for the PowerTrack stream.
+# The socket reader only pushes batches of raw activities into a bounded queue, a pool of
+# decoder workers (threads or processes) validates them, and a single writer thread emits them.
+import json
+import multiprocessing
+import queue
+import threading
+import time
+
+STOP = None  # Sentinel passed down the pipeline on shutdown
+
+
+def decode_activity(activity):
+    # Returns (Tweet ID, raw activity) if the activity is valid JSON, otherwise None
+    try:
+        parsed = json.loads(activity)
+    except ValueError:
+        return None
+    tweet_id = parsed.get("id_str") if isinstance(parsed, dict) else None
+
+    return tweet_id, activity
+
+
+# Decoders return (Tweet ID, record) - the record is what gets passed to the writer
+def decode_worker(in_queue, out_queue, decoder):
+    while True:
+        batch = in_queue.get()
+        if batch is STOP:
+            out_queue.put(STOP)
+            break
+        started = time.perf_counter()
+        decoded = []
+        errors = 0
+        for activity in batch:
+            result = decoder(activity)
+            if result is None:
+                errors += 1
+            else:
+                decoded.append(result)
+        out_queue.put((decoded, errors, len(batch), time.perf_counter() - started))
+
+
+class StreamPipeline:
+    """
+    Decouples the socket read loop from decoding and output.
+    `submit()` never waits on a decoder or the writer unless `on_full` is set to 'block'.
+    """
+
+    def __init__(self, write, workers=2, worker_type="thread", queue_size=1000, on_full="drop",
+                 decoder=decode_activity, dedup=None):
+        self.write = write
+        self.dedup = dedup
+        self.workers = workers
+        self.on_full = on_full
+        self.decoder = decoder
+        if worker_type == "process":
+            self.in_queue = multiprocessing.Queue(queue_size)
+            self.out_queue = multiprocessing.Queue(queue_size)
+            self.worker_class = multiprocessing.Process
+        else:
+            self.in_queue = queue.Queue(queue_size)
+            self.out_queue = queue.Queue(queue_size)
+            self.worker_class = threading.Thread
+        self.counters = {"submitted": 0, "written": 0, "decode_errors": 0, "duplicates": 0, "dropped": 0,
+                         "stalls": 0, "stall_seconds": 0.0, "decoded": 0, "decode_seconds": 0.0}
+        self.lock = threading.Lock()
+        self.threads = []
+
+    def start(self):
+        for _ in range(self.workers):
+            worker = self.worker_class(target=decode_worker, daemon=True,
+                                       args=(self.in_queue, self.out_queue, self.decoder))
+            worker.start()
+            self.threads.append(worker)
+        self.writer = threading.Thread(target=self.write_loop, daemon=True)
+        self.writer.start()
+
+    def submit(self, batch):
+        if not batch:
+            return
+        try:
+            self.in_queue.put_nowait(batch)
+        except queue.Full:
+            # Decoders are behind - either drop the batch or wait (and record the stall)
+            with self.lock:
+                self.counters["stalls"] += 1
+            if self.on_full == "drop":
+                with self.lock:
+                    self.counters["dropped"] += len(batch)
+                return
+            started = time.monotonic()
+            self.in_queue.put(batch)
+            with self.lock:
+                self.counters["stall_seconds"] += time.monotonic() - started
+        with self.lock:
+            self.counters["submitted"] += len(batch)
+
+    def write_loop(self):
+        stopped = 0
+        while stopped < self.workers:
+            item = self.out_queue.get()
+            if item is STOP:
+                stopped += 1
+                continue
+            decoded, errors, batch_size, decode_seconds = item
+            written = 0
+            duplicates = 0
+            # Dedup lives here because the writer is the one stage that sees every activity (and runs on one thread)
+            dedup = self.dedup
+            for tweet_id, record in decoded:
+                if dedup is not None and tweet_id is not None and dedup.seen(tweet_id):
+                    duplicates += 1
+                    continue
+                self.write(record)
+                written += 1
+            with self.lock:
+                self.counters["written"] += written
+                self.counters["duplicates"] += duplicates
+                self.counters["decode_errors"] += errors
+                self.counters["decoded"] += batch_size
+                self.counters["decode_seconds"] += decode_seconds
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+        stats["stall_seconds"] = round(stats["stall_seconds"], 3)
+        decode_seconds = stats.pop("decode_seconds")
+        stats["decode_latency_us"] = round(decode_seconds / stats["decoded"] * 1e6, 1) if stats["decoded"] else None
+        stats["decode_queue_depth"] = queue_depth(self.in_queue)
+        stats["write_queue_depth"] = queue_depth(self.out_queue)
+
+        return stats
+
+    def stop(self):
+        for _ in range(self.workers):
+            self.in_queue.put(STOP)
+        self.writer.join()
+
+
+def queue_depth(q):
+    try:
+        return q.qsize()
+    except NotImplementedError:  # multiprocessing.Queue on macOS
+        return None
@@ -0,0 +1,123 @@
+# Sync a stream's rules to a desired rule set - fetches the live rules once, diffs them against
+# the rules file by (value, tag), then applies only the deletes and adds in batched requests.
+import argparse
+import json
+import os
+import sys
+
+import requests
+from dotenv import load_dotenv
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))  # For gnip_client.py
+from gnip_client import new_session
+from rule_linter import valid_rules
+from rules import (RuleSnapshot, build_batches, load_rules, report_failures, rule_failures, rule_key,
+                   send_batches)
+load_dotenv(verbose=True)  # Throws error if it can't find .env file
+
+# Argparse for cli options. Run `python sync_rules.py -h` to see list of available arguments.
+parser = argparse.ArgumentParser()
+parser.add_argument("-f", "--rules_file", required=True,
+                    help="Desired rules as a JSON, NDJSON or CSV file ('-' for stdin).")
+parser.add_argument("--format", choices=['json', 'ndjson', 'csv'], help="Rules file format (default: from the file extension).")
+parser.add_argument("-s", "--snapshot", default="rules_snapshot.json",
+                    help="Local snapshot of the live rules (default: rules_snapshot.json).")
+parser.add_argument("--use_snapshot", action="store_true",
+                    help="Diff against the local snapshot instead of fetching the live rules.")
+parser.add_argument("-w", "--workers", type=int, default=4, help="Max concurrent requests (default: 4).")
+parser.add_argument("--dry_run", action="store_true", help="Print the diff without changing any rules.")
+parser.add_argument("--skip_invalid", action="store_true",
+                    help="Leave out rules that fail the offline linter instead of stopping before any request.")
+args = parser.parse_args()
+
+USERNAME = os.getenv("USERNAME")
+PASSWORD = os.getenv("PASSWORD")
+ACCOUNT_NAME = os.getenv("ACCOUNT_NAME")
+ENDPOINT_LABEL = os.getenv("POWERTRACK_LABEL")
+
+domain = "https://gnip-api.twitter.com/rules"
+
+endpoint = f"{domain}/powertrack/accounts/{ACCOUNT_NAME}/publishers/twitter/{ENDPOINT_LABEL}.json"
+delete_endpoint = f"{endpoint}?_method=delete"
+
+session = new_session(auth=(USERNAME, PASSWORD), pool_size=args.workers)
+
+
+def main():
+    rules = load_rules(args.rules_file, args.format)
+    desired = valid_rules(rules, args.skip_invalid)
+    # Rules skipped by --skip_invalid are left alone on the stream rather than deleted
+    skipped = {rule_key(rule) for rule in rules} - {rule_key(rule) for rule in desired}
+    snapshot = None
+    if args.use_snapshot and os.path.isfile(args.snapshot):
+        snapshot = RuleSnapshot.load(args.snapshot)
+        to_add, to_delete = snapshot.diff(desired)
+        # Rules added without an ID in the response can only be deleted after a refetch
+        if any("id" not in rule for rule in to_delete):
+            snapshot = None
+    if snapshot is None:
+        snapshot = fetch_snapshot(session)
+        to_add, to_delete = snapshot.diff(desired)
+    to_delete = [rule for rule in to_delete if rule_key(rule) not in skipped]
+
+    print(f"Live rules: {len(snapshot.by_key)}, desired rules: {len(desired)}")
+    print(f"To delete: {len(to_delete)}, to add: {len(to_add)}")
+    if args.dry_run:
+        for rule in to_delete:
+            print(f"- {json.dumps(rule)}")
+        for rule in to_add:
+            print(f"+ {json.dumps(rule)}")
+        return
+
+    # Deletes go first so a rule whose tag changed can be re-added under the new tag
+    failed = delete(session, snapshot, to_delete) + add(session, snapshot, to_add)
+    snapshot.save(args.snapshot)
+    print(f"Done. Live rules: {len(snapshot.by_key)}, failed: {failed}")
+    if failed:
+        sys.exit(1)
+
+
+def fetch_snapshot(session):
+    try:
+        snapshot = RuleSnapshot.fetch(session, endpoint)
+    except requests.exceptions.RequestException as e:
+        print(e)
+        sys.exit(120)
+    snapshot.save(args.snapshot)
+
+    return snapshot
+
+
+def delete(session, snapshot, rules):
+    failed = 0
+    by_id = {rule["id"]: rule for rule in rules}
+    batches = build_batches(list(by_id), key="rule_ids")
+    for batch, response in send_batches(session, delete_endpoint, batches, key="rule_ids", workers=args.workers):
+        failed += report_failures(response, batch, "deleted")
+        if not isinstance(response, Exception) and response.ok:
+            not_deleted = {rule.get("id") for rule, _ in rule_failures(response, "deleted") if rule}
+            for rule_id in batch:
+                if rule_id not in not_deleted:
+                    snapshot.remove(rule_key(by_id[rule_id]))
+
+    return failed
+
+
+def add(session, snapshot, rules):
+    failed = 0
+    for batch, response in send_batches(session, endpoint, build_batches(rules), workers=args.workers):
+        failed += report_failures(response, batch, "created")
+        if not isinstance(response, Exception) and response.ok:
+            # Keep the IDs the API assigned so later deletes can use the snapshot
+            detail = json.loads(response.text).get("detail", [])
+            created = {rule_key(item["rule"]): item["rule"] for item in detail if item.get("created")}
+            rejected = {rule_key(rule) for rule, _ in rule_failures(response) if rule}
+            for rule in batch:
+                key = rule_key(rule)
+                if key not in rejected:
+                    snapshot.add(created.get(key, rule))
+
+    return failed
+
+
+if __name__ == '__main__':
+    main()
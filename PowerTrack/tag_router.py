@@ -0,0 +1,69 @@
+# Routes raw stream activities to per-tag outputs using `matching_rules[].tag`.
+# Only the Tweet ID and the matching rules are extracted; the rest of the activity is never parsed
+# and the original bytes are written unchanged.
+import json
+import os
+import re
+
+from file_sink import RotatingFileSink
+from stream_metrics import ID_STR
+
+MATCHING_RULES = b'"matching_rules":'
+UNTAGGED = "_untagged"
+UNSAFE_CHARS = re.compile(r"[^A-Za-z0-9_.-]+")
+
+json_decoder = json.JSONDecoder()
+
+
+def scan_activity(activity):
+    # Pipeline decoder: returns (Tweet ID, (raw activity, tags)) or None if the activity is malformed
+    if not activity.startswith(b"{"):
+        return None
+    # The first 'id_str' belongs to the Tweet itself (nested objects come after it)
+    match = ID_STR.search(activity)
+    tweet_id = match.group(1).decode("ascii") if match else None
+
+    return tweet_id, (activity, matching_tags(activity))
+
+
+def matching_tags(activity):
+    # 'matching_rules' is appended at the end of every activity, so searching from the right
+    # means only the short tail is decoded. Quotes inside Tweet text are escaped and can't match.
+    start = activity.rfind(MATCHING_RULES)
+    if start == -1:
+        return []
+    tail = activity[start + len(MATCHING_RULES):].decode("utf-8", errors="replace")
+    try:
+        rules, _ = json_decoder.raw_decode(tail.lstrip())
+    except ValueError:
+        return []
+
+    return sorted({rule.get("tag") or UNTAGGED for rule in rules if isinstance(rule, dict)})
+
+
+class TagRouter:
+    """
+    Fans activities out to one rotating file sink per tag (created on first use).
+    Activities that match several rules are written once per distinct tag.
+    """
+
+    def __init__(self, output_dir, **sink_options):
+        self.output_dir = output_dir
+        self.sink_options = sink_options
+        self.sinks = {}
+
+    def write(self, record):
+        activity, tags = record
+        for tag in tags or [UNTAGGED]:
+            sink = self.sinks.get(tag)
+            if sink is None:
+                sink = self.sinks[tag] = self.open_sink(tag)
+            sink.write(activity)
+
+    def open_sink(self, tag):
+        safe_tag = UNSAFE_CHARS.sub("_", tag).strip(".") or UNTAGGED
+        return RotatingFileSink(os.path.join(self.output_dir, safe_tag), prefix=safe_tag, **self.sink_options)
+
+    def close(self):
+        for sink in self.sinks.values():
+            sink.close()
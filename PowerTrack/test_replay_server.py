@@ -0,0 +1,22 @@
+# Run with `python -m pytest` from the PowerTrack folder
+import requests
+
+from replay_server import ReplayServer, synthetic_activities
+
+
+def test_replay_without_loop_sends_whole_file():
+    # Smaller than one batch, so nothing would be flushed before the server goes idle
+    server = ReplayServer(synthetic_activities(10), port=0, keep_alive=1).start()
+    try:
+        response = requests.get(f"http://127.0.0.1:{server.port}/stream", stream=True, timeout=5)
+        received = 0
+        for line in response.iter_lines():
+            if not line:
+                break  # First keep-alive - the file has been sent
+            received += 1
+        response.close()
+    finally:
+        server.stop()
+
+    assert received == 10
+    assert server.activities_sent == 10
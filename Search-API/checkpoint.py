@@ -0,0 +1,46 @@
+# Pagination checkpoints for search.py - after each page is durably written, the next token, page
+# count and output file offset are saved so an interrupted run can pick up where it stopped.
+import hashlib
+import json
+import os
+
+
+def request_key(request_body):
+    # The same query, dates and page size always map to the same checkpoint file
+    request = {key: value for key, value in request_body.items() if key != "next"}
+    encoded = json.dumps(request, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+class Checkpoint:
+    def __init__(self, directory, request_body, output):
+        self.directory = directory
+        self.path = os.path.join(directory, f"{request_key(request_body)}.json")
+        self.output = os.path.abspath(output)
+
+    def load(self):
+        # Returns the saved state, or None if there is nothing to resume
+        if not os.path.isfile(self.path):
+            return None
+        with open(self.path, "r", encoding="utf-8") as read_file:
+            state = json.load(read_file)
+        if state["output"] != self.output:
+            raise ValueError(f"checkpoint {self.path} was written for {state['output']}, not {self.output}")
+
+        return state
+
+    def save(self, next_token, pages, offset, records):
+        # Write, fsync, then rename so a crash leaves either the old or the new checkpoint
+        os.makedirs(self.directory, exist_ok=True)
+        state = {"output": self.output, "next": next_token, "pages": pages, "offset": offset, "records": records}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as outfile:
+            json.dump(state, outfile)
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.isfile(self.path):
+            os.remove(self.path)
@@ -0,0 +1,76 @@
+# Local time series of minute counts for one query, so repeated counts polls only fetch the minutes
+# added since the last run. Counts are kept as a flat array of 64-bit ints (one per minute from a
+# midnight-aligned start), saved with a one-line JSON header.
+import array
+import datetime
+import hashlib
+import json
+import os
+
+from search_windows import format_date, parse_date
+
+MINUTE = datetime.timedelta(minutes=1)
+ROLLUPS = {"minute": 1, "hour": 60, "day": 1440}
+
+
+def store_path(directory, query):
+    return os.path.join(directory, f"{hashlib.sha256(query.encode('utf-8')).hexdigest()[:16]}.counts")
+
+
+class CountsStore:
+    def __init__(self, path, query, start):
+        self.path = path
+        self.query = query
+        self.start = start.replace(hour=0, minute=0)  # Day roll-ups line up with UTC days
+        self.counts = array.array("q")
+        self.complete_until = start  # Minutes before this are final and never refetched
+
+    @classmethod
+    def load(cls, path, query, start):
+        # Opens the saved series, or starts an empty one at `start` (a datetime)
+        if not os.path.isfile(path):
+            return cls(path, query, start)
+        with open(path, "rb") as read_file:
+            header = json.loads(read_file.readline())
+            store = cls(path, header["query"], parse_date(header["start"]))
+            store.complete_until = parse_date(header["complete_until"])
+            store.counts.frombytes(read_file.read())
+
+        return store
+
+    def save(self):
+        # Write then rename so a crash never leaves a truncated series
+        header = {"query": self.query, "start": format_date(self.start),
+                  "complete_until": format_date(self.complete_until)}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as outfile:
+            outfile.write(json.dumps(header).encode("utf-8") + b"\n")
+            self.counts.tofile(outfile)
+        os.replace(tmp_path, self.path)
+
+    def index(self, when):
+        return int((when - self.start) / MINUTE)
+
+    def update(self, counts, complete_until):
+        # counts: [(timePeriod, count)] at minute resolution
+        positions = [(self.index(parse_date(time_period)), count) for time_period, count in counts]
+        end = max([position + 1 for position, _ in positions] + [self.index(complete_until)])
+        if end > len(self.counts):
+            self.counts.frombytes(bytes(self.counts.itemsize * (end - len(self.counts))))  # Zero-filled
+        for position, count in positions:
+            if position >= 0:
+                self.counts[position] = count
+        self.complete_until = max(self.complete_until, complete_until)
+
+    def series(self, rollup="minute", from_date=None, to_date=None):
+        """
+        Returns [(timePeriod, count)] summed into minute, hour or day buckets, optionally limited
+        to [from_date, to_date). Whole slices are summed at once rather than minute by minute.
+        """
+        step = ROLLUPS[rollup]
+        first = 0 if from_date is None else max(0, self.index(from_date) // step * step)
+        last = len(self.counts) if to_date is None else min(len(self.counts), self.index(to_date))
+        counts = self.counts
+        return [(format_date(self.start + position * MINUTE), sum(counts[position:min(position + step, last)]))
+                for position in range(first, last, step)]
@@ -0,0 +1,121 @@
+# NDJSON output for search results - one compact JSON record per Tweet (or count bucket), written
+# page by page so memory use doesn't grow with the number of pages fetched.
+import json
+import os
+import re
+import shutil
+import sys
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+EXTENSIONS = {".gz": "gzip", ".zst": "zstd"}
+RESULTS = re.compile(r'"results"\s*:\s*\[')
+SEPARATORS = re.compile(r"[\s,]*")
+DECODER = json.JSONDecoder()
+
+
+def guess_compression(path):
+    for extension, compression in EXTENSIONS.items():
+        if path.endswith(extension):
+            return compression
+
+    return "none"
+
+
+class NDJSONWriter:
+    """
+    Writes each page of results as its own complete gzip member or zstd frame. Concatenated
+    members are still one valid file, so the output is readable after every page.
+    """
+
+    def __init__(self, path, compression=None, level=6, file=None, offset=None):
+        self.compression = compression or guess_compression(path)
+        if self.compression == "zstd" and zstandard is None:
+            raise RuntimeError("zstd compression requires the 'zstandard' package (pip install zstandard)")
+        self.level = level
+        self.path = path
+        if file is None and offset is not None:
+            # Resuming - drop anything written after the last checkpointed page
+            file = open(path, "r+b")
+            file.truncate(offset)
+            file.seek(offset)
+        elif file is None:
+            file = sys.stdout.buffer if path == "-" else open(path, "wb")
+        self.file = file
+        self.records = 0
+
+    def write_page(self, results, text=None):
+        # `text` is the response body the results were parsed from - when given, each record is
+        # written exactly as the API sent it instead of being serialized again
+        if not results:
+            return 0
+        records = raw_records(text, len(results)) if text is not None else None
+        if records is None:
+            # Re-serialized compactly as they are - no sorting or indenting
+            records = [json.dumps(result, separators=(",", ":"), ensure_ascii=False) for result in results]
+        lines = "".join(record + "\n" for record in records)
+        self.file.write(self.compress(lines.encode("utf-8")))
+        self.records += len(results)
+
+        return len(results)
+
+    def append(self, source, records):
+        # Copies already-compressed pages from another writer's file (e.g. a temp file)
+        source.seek(0)
+        shutil.copyfileobj(source, self.file)
+        self.records += records
+
+    def sync(self):
+        # Makes everything written so far durable and returns the file offset it ends at
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+        return self.file.tell()
+
+    def compress(self, data):
+        if self.compression == "gzip":
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)  # wbits=31 writes a gzip header
+            return compressor.compress(data) + compressor.flush()
+        if self.compression == "zstd":
+            return zstandard.ZstdCompressor(level=self.level).compress(data)
+
+        return data
+
+    def close(self):
+        self.file.flush()
+        if self.file is not sys.stdout.buffer:
+            self.file.close()
+
+
+def raw_records(text, expected):
+    """
+    Returns the text of each element of the response's "results" array as sent, or None if they
+    can't be cut out safely (not `expected` records, or records spread over several lines). The C
+    scanner only finds where each record ends, which is about twice as fast as json.dumps.
+    """
+    match = RESULTS.search(text)
+    if match is None:
+        return None
+    records = []
+    index = match.end()
+    while True:
+        index = SEPARATORS.match(text, index).end()
+        if index >= len(text):
+            return None
+        if text[index] == "]":
+            break
+        try:
+            _, end = DECODER.raw_decode(text, index)
+        except ValueError:
+            return None
+        record = text[index:end]
+        if "\n" in record:
+            return None  # Pretty-printed - only a compact record is one line
+        records.append(record)
+        index = end
+
+    return records if len(records) == expected else None
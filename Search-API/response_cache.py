@@ -0,0 +1,140 @@
+# Local on-disk cache of Search and Counts responses, keyed by the endpoint and the normalized
+# request body. Bodies are stored gzip-compressed; the cache is size-bounded with least recently
+# used eviction, and entries expire after a TTL unless their whole date range is in the past.
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+
+KEY_FIELDS = ("query", "fromDate", "toDate", "maxResults", "bucket", "next")
+SETTLED_AFTER = datetime.timedelta(minutes=30)  # Leave time for late-indexed Tweets
+
+
+def cache_key(endpoint, request_body):
+    # Key order, whitespace and number-vs-string differences don't change the key
+    normalized = {field: str(request_body[field]).strip() for field in KEY_FIELDS
+                  if request_body.get(field) not in (None, "")}
+    encoded = json.dumps([endpoint, normalized], sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def is_closed(request_body):
+    # A window that ended (toDate) long enough ago won't return anything new
+    to_date = request_body.get("toDate")
+    if not to_date:
+        return False  # Runs up to now
+    try:
+        ends = datetime.datetime.strptime(str(to_date), "%Y%m%d%H%M")
+    except ValueError:
+        return False
+
+    return ends + SETTLED_AFTER < datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class CachedResponse:
+    # Just enough of requests.Response for the scripts that read it
+    def __init__(self, text, status_code=200):
+        self.text = text
+        self.status_code = status_code
+        self.ok = True
+        self.headers = {}
+        self.from_cache = True
+
+    def raise_for_status(self):
+        pass
+
+
+class ResponseCache:
+    def __init__(self, directory, max_bytes=1 << 30, ttl=3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self.size = sum(os.path.getsize(path) for path in self.entries())
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json.gz")
+
+    def entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json.gz"):
+                    yield os.path.join(root, name)
+
+    def get(self, endpoint, request_body):
+        path = self.path(cache_key(endpoint, request_body))
+        try:
+            with open(path, "rb") as read_file:
+                header, text = zlib.decompress(read_file.read(), 31).decode("utf-8").split("\n", 1)
+        except (OSError, zlib.error, ValueError):
+            self.misses += 1
+            return None
+        header = json.loads(header)
+        if not header["closed"] and time.time() - header["created"] > self.ttl:
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)  # The modification time doubles as the LRU clock
+        except OSError:
+            pass  # Evicted by another thread or process since it was read - the hit still counts
+        self.hits += 1
+
+        return CachedResponse(text)
+
+    def put(self, endpoint, request_body, text):
+        path = self.path(cache_key(endpoint, request_body))
+        header = json.dumps({"created": time.time(), "closed": is_closed(request_body)})
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        data = compressor.compress(f"{header}\n{text}".encode("utf-8")) + compressor.flush()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so concurrent readers never see a partial entry
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as outfile:
+            outfile.write(data)
+        with self.lock:
+            if os.path.isfile(path):
+                self.size -= os.path.getsize(path)
+            os.replace(tmp_path, path)
+            self.size += len(data)
+            if self.size > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        # Drops least recently used entries until the cache is back to 90% of its limit
+        entries = sorted(self.entries(), key=os.path.getmtime)
+        for path in entries:
+            if self.size <= self.max_bytes * 0.9:
+                break
+            self.size -= os.path.getsize(path)
+            os.remove(path)
+
+
+class CachingSession:
+    """
+    Wraps a session so POSTs are answered from the cache when possible. Only successful
+    responses are stored. Anything else is passed through to the wrapped session.
+    """
+
+    def __init__(self, session, cache):
+        self.session = session
+        self.cache = cache
+
+    def post(self, url, json=None, **kwargs):
+        cached = self.cache.get(url, json)
+        if cached is not None:
+            return cached
+        response = self.session.post(url=url, json=json, **kwargs)
+        if response.status_code == 200:
+            self.cache.put(url, json, response.text)
+
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
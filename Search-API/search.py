@@ -1,11 +1,23 @@
 # Enterprise Search Tweets - Make a data or counts request against 30-day or Full-Archive Search
 import argparse
+import datetime
 import json
 import os
+import shutil
 import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 from dotenv import load_dotenv
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))  # For gnip_client.py
+from checkpoint import Checkpoint
+from counts_store import ROLLUPS, CountsStore, store_path
+from gnip_client import SCHEDULER, new_session
+from ndjson_output import NDJSONWriter
+from response_cache import CachingSession, ResponseCache
+from search_windows import fetch_counts, format_date, parse_date, split_windows
 load_dotenv(verbose=True)  # Throws error if it can't find .env file
 
 # Argparse for cli options. Run `python search.py -h` to see the list of arguments.
@@ -22,7 +34,36 @@ parser.add_argument("-b", "--bucket", choices=['day', 'hour', 'minute'],
                     help="The unit of time for which count data will be provided.")
 parser.add_argument("-n", "--next", help="Auto paginate through next tokens", action="store_true")
 parser.add_argument("-p", "--pretty_print", help="Pretty print the results", action="store_true")
+parser.add_argument("-o", "--output", help="Write results as NDJSON, one record per line, to this file\
+                    ('.gz'/'.zst' to compress, '-' for stdout)")
+parser.add_argument("--compression", choices=['gzip', 'zstd', 'none'],
+                    help="Compression for --output (default: from the file extension)")
+parser.add_argument("--resume", action="store_true", help="Continue an interrupted -n -o FILE run from its\
+                    last checkpoint")
+parser.add_argument("--checkpoint_dir", default="checkpoints",
+                    help="Where pagination checkpoints are kept (default: checkpoints)")
+parser.add_argument("--cache", action="store_true", help="Answer repeated requests from a local response cache")
+parser.add_argument("--cache_dir", default="cache", help="Response cache directory (default: cache)")
+parser.add_argument("--cache_size", type=int, default=1024, help="Max response cache size in MB (default: 1024)")
+parser.add_argument("--cache_ttl", type=int, default=3600, help="Seconds before a cached response for a date\
+                    range that isn't over yet expires (default: 3600)")
+parser.add_argument("--store", help="Keep minute counts for the query in a local time series in this directory\
+                    and only fetch the minutes added since the last run (counts requests)")
+parser.add_argument("--rollup", choices=list(ROLLUPS), default="hour",
+                    help="Bucket size printed from --store (default: hour)")
+parser.add_argument("-w", "--windows", type=int, help="Split the date range into this many windows of similar\
+                    Tweet volume (from a counts request) and paginate them concurrently")
+parser.add_argument("--window_bucket", choices=['day', 'hour', 'minute'], default="hour",
+                    help="Counts bucket used to place window boundaries (default: hour)")
+parser.add_argument("--rate_limit", type=int, help="Max search requests per minute, shared by all windows\
+                    (default: 60, or RATE_LIMIT_SEARCH)")
 args = parser.parse_args()
+if args.windows and args.counts:
+    parser.error("-w/--windows only applies to data requests")
+if args.store and (not args.counts or not args.query or args.bucket not in (None, "minute") or args.request_file):
+    parser.error("--store needs -c and -q (it always stores minute buckets)")
+if args.resume and (args.windows or not args.next or args.output in (None, "-")):
+    parser.error("--resume needs -n and -o FILE (and can't be combined with -w/--windows)")
 
 # Retrieves and stores credential information from the '.env' file
 USERNAME = os.getenv("USERNAME")
@@ -31,50 +72,235 @@ ACCOUNT_NAME = os.getenv("ACCOUNT_NAME")
 ENDPOINT_LABEL = os.getenv("SEARCH_LABEL")
 ARCHIVE = os.getenv ("SEARCH_ARCHIVE")
 
+# Status messages move to stderr when the NDJSON output goes to stdout
+messages = sys.stderr if args.output == "-" else sys.stdout
+
+STORE_SLICE = datetime.timedelta(days=1)  # Long gaps in a --store series are fetched in concurrent slices
+STORE_WORKERS = 4
+SETTLE = datetime.timedelta(minutes=10)  # Minutes newer than this may still change and are refetched
+
+session = new_session(auth=(USERNAME, PASSWORD), pool_size=args.windows)
+if args.rate_limit:
+    SCHEDULER.configure("search", args.rate_limit)
+if args.cache:
+    session = CachingSession(session, ResponseCache(args.cache_dir, args.cache_size << 20, args.cache_ttl))
+
 
 def main():
-    endpoint = determine_endpoint()
+    endpoint = determine_endpoint(args.counts)
     # Build request body from file if it exists, else use cli args
     if args.request_file is True:
         request_body = build_request_from_file("request.json")
     else:
         request_body = build_request_body(args.query)
+    output = None
+    checkpoint = None
+    state = None
+    if args.output:
+        # Paginated runs into a file are checkpointed after every page
+        if args.next and args.output != "-" and not args.windows:
+            checkpoint = Checkpoint(args.checkpoint_dir, request_body, args.output)
+            try:
+                state = checkpoint.load() if args.resume else None
+            except ValueError as e:
+                print(e)
+                sys.exit(1)
+        output = NDJSONWriter(args.output, args.compression, offset=state["offset"] if state else None)
+    if args.windows:
+        parallel_search(endpoint, request_body, output)
+        return
+    if args.store:
+        update_counts_store(endpoint, request_body)
+        return
+    if state:
+        print(f"Resuming after page {state['pages']} ({state['records']} records written).", file=messages)
+        output.records = state["records"]
+        paginate(endpoint, request_body, state["next"], state["pages"], output, checkpoint)
+        return
+    if args.resume:
+        print("No checkpoint found for this request, starting from the first page.", file=messages)
     # Make the first request
     try:
-        first_response = requests.post(url=endpoint, auth=(USERNAME, PASSWORD), json=request_body)
+        first_response = session.post(url=endpoint, auth=(USERNAME, PASSWORD), json=request_body)
     except requests.exceptions.RequestException as e:
         print(e)
         sys.exit(120)
-    print(f"Status: {first_response.status_code}\n", format_response(first_response), "\n")
     json_response = (json.loads(first_response.text))
+    if output is None:
+        print(f"Status: {first_response.status_code}\n", format_response(first_response), "\n")
+    else:
+        print(f"Status: {first_response.status_code}", file=messages)
+        write_page(first_response, json_response, output)
+        save_checkpoint(checkpoint, output, json_response.get("next"), 1)
 
     # Pagination logic (if -n flag is passed, paginate through the results)
     if json_response.get("next") is None or args.next is False:
-        print(f"Request complete.")
+        print(f"Request complete.", file=messages)
+        close_output(output, checkpoint)
     elif json_response.get("next") is not None and args.next:
+        paginate(endpoint, request_body, json_response.get("next"), 1, output, checkpoint)
+
+
+def paginate(endpoint, request_body, next_token, request_count, output=None, checkpoint=None):
+    # request_count keeps track of the number of requests made so far (pagination)
+    while next_token is not None:
+        # Update request_body with next token
+        request_body.update(next=next_token)
+        # Make the request with the next token
+        try:
+            response = session.post(url=endpoint, auth=(USERNAME, PASSWORD), json=request_body)
+        except requests.exceptions.RequestException as e:
+            print(e)
+            sys.exit(120)
+        # Parse n response and it's 'next' token
+        n_response = (json.loads(response.text))
+        write_page(response, n_response, output)
+        next_token = n_response.get("next")
+        request_count += 1  # Iterates the request counter
+        save_checkpoint(checkpoint, output, next_token, request_count)
+
+    print(f"Done paginating.\nTotal requests made: {request_count}", file=messages)
+    close_output(output, checkpoint)
+
+
+def save_checkpoint(checkpoint, output, next_token, pages):
+    # Only once the page is on disk, so resuming never skips records
+    if checkpoint is not None and next_token is not None:
+        checkpoint.save(next_token, pages, output.sync(), output.records)
+
+
+def close_output(output, checkpoint=None):
+    if output is None:
+        return
+    output.close()
+    if checkpoint is not None:
+        checkpoint.clear()  # The run completed, so there is nothing left to resume
+    print(f"Wrote {output.records} records to {args.output}", file=messages)
+
+
+def write_page(response, json_response, output):
+    # Prints the page as returned, or appends its results to the NDJSON output one per line
+    if output is None:
+        print(format_response(response), "\n")
+        return
+    if response.status_code != 200:
+        output.close()
+        sys.stderr.write(f"Status {response.status_code}: {response.text}\n")
+        sys.exit(1)
+    output.write_page(json_response.get("results", []), response.text)
+
+
+def parallel_search(endpoint, request_body, output):
+    if not (request_body.get("fromDate") and request_body.get("toDate")):
+        print("-w/--windows needs both a fromDate and a toDate.")
+        sys.exit(1)
+    try:
+        counts = fetch_counts(session, determine_endpoint(counts=True), request_body, args.window_bucket)
+    except requests.exceptions.RequestException as e:
+        print(e)
+        sys.exit(120)
+    windows = split_windows(counts, args.windows, request_body["fromDate"], request_body["toDate"],
+                            args.window_bucket)
+    for number, (from_date, to_date, estimate) in enumerate(windows, 1):
+        sys.stderr.write(f"Window {number}/{len(windows)}: {from_date}-{to_date} (~{estimate} Tweets)\n")
+
+    # Windows are paginated concurrently into temp files, then written out newest first - the
+    # same order a serial search returns results in. The session paces all of them together.
+    stop = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=len(windows))
+    futures = [executor.submit(search_window, endpoint, dict(request_body, fromDate=from_date, toDate=to_date),
+                               stop)
+               for from_date, to_date, _ in windows]
+    request_count = 0
+    failed = False
+    try:
+        for future in reversed(futures):
+            spool, records, requests_made, ok = future.result()
+            with spool:
+                if output is None:
+                    sys.stdout.flush()
+                    spool.seek(0)
+                    shutil.copyfileobj(spool, sys.stdout.buffer)
+                else:
+                    output.append(spool, records)
+            request_count += requests_made
+            failed = failed or not ok
+    except requests.exceptions.RequestException as e:
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+        print(e)
+        sys.exit(120)
+    executor.shutdown()
+
+    print(f"Done paginating {len(windows)} windows.\nTotal data requests made: {request_count}", file=messages)
+    if output is not None:
+        output.close()
+        print(f"Wrote {output.records} records to {args.output}", file=messages)
+    if failed:
+        sys.exit(1)
+
+
+def update_counts_store(endpoint, request_body):
+    # Naive UTC, like the dates parsed from the command line and the store
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None, second=0, microsecond=0)
+    start = parse_date(args.from_date) if args.from_date else now - datetime.timedelta(days=30)
+    store = CountsStore.load(store_path(args.store, args.query), args.query, start)
+    # Only the minutes after the last complete one are requested
+    slices = []
+    slice_start = store.complete_until
+    while slice_start < now:
+        slices.append((slice_start, min(slice_start + STORE_SLICE, now)))
+        slice_start += STORE_SLICE
+    with ThreadPoolExecutor(max_workers=STORE_WORKERS) as executor:
+        futures = [executor.submit(fetch_counts, session, endpoint,
+                                   {"query": args.query, "fromDate": format_date(slice_from),
+                                    "toDate": format_date(slice_to)}, "minute")
+                   for slice_from, slice_to in slices]
+        try:
+            counts = [count for future in futures for count in future.result()]
+        except requests.exceptions.RequestException as e:
+            print(e)
+            sys.exit(120)
+    store.update(counts, max(store.complete_until, now - SETTLE))
+    store.save()
+    sys.stderr.write(f"Fetched {len(counts)} minutes in {len(slices)} slices, "
+                     f"{len(store.counts)} minutes stored in {store.path}\n")
+
+    to_date = parse_date(args.to_date) if args.to_date else None
+    print("timePeriod,count")
+    for time_period, count in store.series(args.rollup, parse_date(args.from_date) if args.from_date else None,
+                                           to_date):
+        print(f"{time_period},{count}")
+
+
+def search_window(endpoint, request_body, stop):
+    # Paginates one window into a temp file, returning (temp file, records, requests made, completed without an error)
+    spool = tempfile.TemporaryFile()
+    writer = NDJSONWriter(args.output, args.compression, file=spool) if args.output else None
+    request_count = 0
+    while not stop.is_set():
+        response = session.post(url=endpoint, json=request_body)
+        request_count += 1
+        if response.status_code != 200:
+            sys.stderr.write(f"Window {request_body['fromDate']}-{request_body['toDate']} stopped early, "
+                             f"status {response.status_code}: {response.text}\n")
+            return spool, writer.records if writer else 0, request_count, False
+        json_response = json.loads(response.text)
+        if writer is None:
+            spool.write(f"{format_response(response)} \n\n".encode("utf-8"))
+        else:
+            writer.write_page(json_response.get("results", []), response.text)
         next_token = json_response.get("next")
-        request_count = 1  # Keep track of the number of requests being made (pagination) 
-        while next_token is not None:
-            # Update request_body with next token
-            request_body.update(next=next_token)
-            # Make the request with the next token
-            try:
-                response = requests.post(url=endpoint, auth=(USERNAME, PASSWORD), json=request_body)
-            except requests.exceptions.RequestException as e:
-                print(e)
-                sys.exit(120)
-            print(format_response(response), "\n")
-            # Parse n response and it's 'next' token
-            n_response = (json.loads(response.text))
-            next_token = n_response.get("next")
-            request_count += 1  # Iterates the request counter
+        if next_token is None:
+            break
+        request_body.update(next=next_token)
 
-        print(f"Done paginating.\nTotal requests made: {request_count}")
+    return spool, writer.records if writer else 0, request_count, True
 
 
-def determine_endpoint():
+def determine_endpoint(counts=False):
     domain = "https://gnip-api.twitter.com"
-    if args.counts:
+    if counts:
         endpoint = f"{domain}/search/{ARCHIVE}/accounts/{ACCOUNT_NAME}/{ENDPOINT_LABEL}/counts.json"
     else:
         endpoint = f"{domain}/search/{ARCHIVE}/accounts/{ACCOUNT_NAME}/{ENDPOINT_LABEL}.json"
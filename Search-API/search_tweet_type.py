@@ -1,12 +1,16 @@
 # Enterprise Search Tweets - Data request with Tweet type function to demonstrate how to classify Tweets
 # Supports data request only (not counts) and returns parsed Tweet payload (only select fields)
 import argparse
+import collections
 import json
 import os
 import sys
 
 import requests
 from dotenv import load_dotenv
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))  # For gnip_client.py
+from gnip_client import new_session
+from tweet_classifier import ClassifiedWriter, classify_files, classify_page, print_counts
 load_dotenv(verbose=True)  # Throws error if it can't find .env file
 
 # Argparse for cli options. Run `python search_tweet_type.py -h` to see the list of arguments.
@@ -21,6 +25,13 @@ parser.add_argument("-m", "--max_results", help="Maximum number of results retur
 parser.add_argument("-b", "--bucket", choices=['day', 'hour', 'minute'],
                     help="The unit of time for which count data will be provided.")
 parser.add_argument("-n", "--next", help="Auto paginate through next tokens", action="store_true")
+parser.add_argument("-i", "--input", nargs='+', help="Classify Tweets from NDJSON files ('.gz' ok, '-' for stdin)\
+                    instead of making a search request")
+parser.add_argument("-o", "--output", help="Write compact classified rows to this file ('.gz' to compress,\
+                    '-' for stdout)")
+parser.add_argument("--format", choices=['ndjson', 'csv'], default="ndjson",
+                    help="Output format for -o or -i (default: ndjson)")
+parser.add_argument("--processes", type=int, help="Worker processes for -i (default: one per CPU)")
 args = parser.parse_args()
 
 # Retrieves and stores credential information from the '.env' file
@@ -30,39 +41,30 @@ ACCOUNT_NAME = os.getenv("ACCOUNT_NAME")
 ENDPOINT_LABEL = os.getenv("SEARCH_LABEL")
 ARCHIVE = os.getenv ("SEARCH_ARCHIVE")
 
+# Status messages move to stderr when the classified rows go to stdout
+messages = sys.stderr if args.output == "-" or (args.input and not args.output) else sys.stdout
+
+session = new_session()
+
 
 def main():
+    if args.input:
+        classify_input()
+        return
     search_endpoint = f"https://gnip-api.twitter.com/search/{ARCHIVE}/accounts/{ACCOUNT_NAME}/{ENDPOINT_LABEL}.json"
     # Build request body from file if it exists, else use cli args
     request_body = build_request_body()
+    writer = ClassifiedWriter(args.output, args.format) if args.output else None
+    counts = collections.Counter()
     # Make first request
     first_response = make_request(search_endpoint, request_body)
     # Deserialize json response
     json_response = (json.loads(first_response.text))
-    # Create Python dict from results list
-    tweet_results = json_response["results"]
-    parsed_results = { "parsed_results": [] }
-
-    # Loop through Tweet results to test for type, extended Tweet, and parse JSON
-    for tweet in tweet_results:
-        extended_tweet = check_for_extended_tweet(tweet)
-        tweet_type = determine_tweet_type(tweet)
-        if extended_tweet is True:
-            text = tweet["extended_tweet"]["full_text"]
-        else:
-            text = tweet["text"]
-        custom_dict = { 
-                "tweet_id": tweet["id_str"],
-                "text": text,
-                "tweet_type": tweet_type,
-                "hyperlink": "https://twitter.com/twitter/status/" + tweet["id_str"]
-        }
-        parsed_results["parsed_results"].append(custom_dict) # Add Tweet to parsed_results list
-    print(json.dumps(parsed_results, indent=2, sort_keys=True))
+    write_page(json_response, writer, counts)
 
     # Pagination logic (if -n flag is passed, paginate through the results)
     if json_response.get("next") is None or args.next is False:
-        print(f"Request complete.")
+        print(f"Request complete.", file=messages)
     elif json_response.get("next") is not None and args.next:
         next_token = json_response.get("next")
         request_count = 1  # Keep track of the number of requests being made (pagination) 
@@ -71,29 +73,36 @@ def main():
             request_body.update(next=next_token)
             # Make the request with the next token
             response = make_request(search_endpoint, request_body)
-            parsed_results = { "parsed_results": [] }
-            # Loop through Tweet results to test for type, extended Tweet, and parse JSON
-            for tweet in tweet_results:
-                extended_tweet = check_for_extended_tweet(tweet)
-                tweet_type = determine_tweet_type(tweet)
-                if extended_tweet is True:
-                    text = tweet["extended_tweet"]["full_text"]
-                else:
-                    text = tweet["text"]
-                custom_dict = { 
-                        "tweet_id": tweet["id_str"],
-                        "text": text,
-                        "tweet_type": tweet_type,
-                        "hyperlink": "https://twitter.com/twitter/status/" + tweet["id_str"]
-                }
-                parsed_results["parsed_results"].append(custom_dict) # Add Tweet to parsed_results
-            print(json.dumps(parsed_results, indent=2, sort_keys=True))
-            # Parse n response and it's 'next' token
+            # Classify the new page and parse its 'next' token
             n_response = (json.loads(response.text))
+            write_page(n_response, writer, counts)
             next_token = n_response.get("next")
             # Iterates the request counter
             request_count += 1
-        print(f"Done paginating.\nTotal requests made: {request_count}")
+        print(f"Done paginating.\nTotal requests made: {request_count}", file=messages)
+    if writer is not None:
+        writer.close()
+    print_counts(counts, messages)
+
+
+def write_page(json_response, writer, counts):
+    # Each page is classified as it arrives, then printed or written to the output file
+    rows, page_counts = classify_page(json_response["results"])
+    counts.update(page_counts)
+    if writer is None:
+        print(json.dumps({"parsed_results": rows}, indent=2, sort_keys=True))
+    else:
+        writer.write(rows)
+
+
+def classify_input():
+    # Classifies saved NDJSON files on a process pool instead of making search requests
+    writer = ClassifiedWriter(args.output or "-", args.format)
+    counts, skipped = classify_files(args.input, writer, args.processes)
+    writer.close()
+    print_counts(counts, messages)
+    if skipped:
+        print(f"Skipped {skipped} lines that weren't Tweets.", file=messages)
 
 
 def build_request_body():
@@ -119,7 +128,7 @@ def build_request_body():
 
 def make_request(endpoint, request_body):
     try:
-        response = requests.post(url=endpoint, auth=(USERNAME, PASSWORD), json=request_body)
+        response = session.post(url=endpoint, auth=(USERNAME, PASSWORD), json=request_body)
     except requests.exceptions.RequestException as e:
         print(e)
         sys.exit(120)
@@ -127,29 +136,5 @@ def make_request(endpoint, request_body):
     return response
 
 
-def determine_tweet_type(tweet):
-    # Check for reply indicator first
-    if tweet["in_reply_to_status_id"] is not None:
-        tweet_type = "Reply Tweet"
-    # Check boolean quote status field but make sure it's not a Retweet (of a Quote Tweet) 
-    elif tweet["is_quote_status"] is True and not tweet["text"].startswith("RT"):
-        tweet_type = "Quote Tweet"
-    # Check both indicators of a Retweet
-    elif tweet["text"].startswith("RT") and tweet.get("retweeted_status") is not None:
-        tweet_type = "Retweet"
-    else:
-        tweet_type = "Original Tweet"
-
-    return tweet_type  
-
-
-def check_for_extended_tweet(tweet):
-    try:
-       value = tweet["extended_tweet"]
-       return True
-    except KeyError:
-        return False
-
-
 if __name__ == '__main__':
     main()
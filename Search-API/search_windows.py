@@ -0,0 +1,66 @@
+# Counts-balanced time slicing for parallel search - uses the counts endpoint to cut a date range
+# into windows holding a similar number of Tweets, so each window takes a similar number of pages.
+import datetime
+import json
+
+DATE_FORMAT = "%Y%m%d%H%M"  # Search API dates, e.g. 201907010000
+BUCKETS = {
+    "day": datetime.timedelta(days=1),
+    "hour": datetime.timedelta(hours=1),
+    "minute": datetime.timedelta(minutes=1),
+}
+
+
+def parse_date(value):
+    return datetime.datetime.strptime(value, DATE_FORMAT)
+
+
+def format_date(value):
+    return value.strftime(DATE_FORMAT)
+
+
+def fetch_counts(session, endpoint, request_body, bucket="hour"):
+    # Returns [(timePeriod, count)] for the range in ascending time order, following 'next' tokens
+    request_body = dict(request_body, bucket=bucket)
+    request_body.pop("maxResults", None)
+    request_body.pop("next", None)
+    counts = []
+    while True:
+        response = session.post(url=endpoint, json=request_body)
+        response.raise_for_status()
+        json_response = json.loads(response.text)
+        counts.extend((result["timePeriod"], result["count"]) for result in json_response.get("results", []))
+        if json_response.get("next") is None:
+            break
+        request_body.update(next=json_response["next"])
+
+    return sorted(counts)
+
+
+def split_windows(counts, windows, from_date, to_date, bucket="hour"):
+    """
+    Cuts [from_date, to_date) at bucket boundaries into at most `windows` windows of similar
+    Tweet volume. Returns a list of (fromDate, toDate, estimated_count) tuples.
+    """
+    total = sum(count for _, count in counts)
+    if windows < 2 or total == 0:
+        return [(from_date, to_date, total)]
+
+    target = total / windows
+    boundaries = [from_date]
+    estimates = []
+    window_count = 0
+    cumulative = 0
+    for time_period, count in counts:
+        cumulative += count
+        window_count += count
+        if cumulative >= target * len(boundaries) and len(boundaries) < windows:
+            cut = format_date(parse_date(time_period) + BUCKETS[bucket])
+            if from_date < cut < to_date:
+                boundaries.append(cut)
+                estimates.append(window_count)
+                window_count = 0
+    boundaries.append(to_date)
+    estimates.append(window_count)
+
+    return list(zip(boundaries, boundaries[1:], estimates))
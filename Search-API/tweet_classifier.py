@@ -0,0 +1,175 @@
+# Tweet type classification shared by search_tweet_type.py - classifies Tweets one page or one
+# batch of NDJSON lines at a time, so large archives can be split across a process pool.
+import collections
+import csv
+import gzip
+import json
+import os
+import sys
+from multiprocessing import Pool
+
+FIELDS = ["tweet_id", "tweet_type", "text", "hyperlink"]
+
+
+def determine_tweet_type(tweet):
+    # Check for reply indicator first
+    if tweet["in_reply_to_status_id"] is not None:
+        tweet_type = "Reply Tweet"
+    # Check boolean quote status field but make sure it's not a Retweet (of a Quote Tweet)
+    elif tweet["is_quote_status"] is True and not tweet["text"].startswith("RT"):
+        tweet_type = "Quote Tweet"
+    # Check both indicators of a Retweet
+    elif tweet["text"].startswith("RT") and tweet.get("retweeted_status") is not None:
+        tweet_type = "Retweet"
+    else:
+        tweet_type = "Original Tweet"
+
+    return tweet_type
+
+
+def check_for_extended_tweet(tweet):
+    return "extended_tweet" in tweet
+
+
+def classify_tweet(tweet):
+    # Reads the full text of extended Tweets so it isn't truncated
+    if check_for_extended_tweet(tweet):
+        text = tweet["extended_tweet"]["full_text"]
+    else:
+        text = tweet["text"]
+
+    return {
+        "tweet_id": tweet["id_str"],
+        "tweet_type": determine_tweet_type(tweet),
+        "text": text,
+        "hyperlink": "https://twitter.com/twitter/status/" + tweet["id_str"],
+    }
+
+
+def classify_page(tweets):
+    # Returns (classified rows, count per type)
+    rows = [classify_tweet(tweet) for tweet in tweets]
+
+    return rows, collections.Counter(row["tweet_type"] for row in rows)
+
+
+def classify_lines(lines):
+    # Process pool worker - returns (classified rows, count per type, lines that weren't Tweets)
+    tweets = []
+    skipped = 0
+    for line in lines:
+        if not line.strip():
+            continue  # Keep-alive or blank line
+        try:
+            tweet = json.loads(line)
+            if "id_str" in tweet and "text" in tweet:
+                tweets.append(tweet)
+                continue
+        except ValueError:
+            pass
+        skipped += 1
+    try:
+        rows, counts = classify_page(tweets)
+    except (KeyError, TypeError, AttributeError):
+        # Classify one by one so a single malformed Tweet only costs itself
+        rows, counts = [], collections.Counter()
+        for tweet in tweets:
+            try:
+                row = classify_tweet(tweet)
+            except (KeyError, TypeError, AttributeError):
+                skipped += 1
+                continue
+            rows.append(row)
+            counts[row["tweet_type"]] += 1
+
+    return rows, counts, skipped
+
+
+def open_input(path):
+    if path == "-":
+        return sys.stdin.buffer
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+
+    return open(path, "rb")
+
+
+def read_batches(paths, batch_lines=5000):
+    # Yields lists of raw lines across all the input files
+    for path in paths:
+        input_file = open_input(path)
+        try:
+            batch = []
+            for line in input_file:
+                batch.append(line)
+                if len(batch) >= batch_lines:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+        finally:
+            if input_file is not sys.stdin.buffer:
+                input_file.close()
+
+
+def classify_files(paths, writer, processes=None, batch_lines=5000):
+    """
+    Classifies NDJSON (optionally .gz) files on a process pool and writes the rows in input
+    order. At most two batches per process are in flight, so memory use stays flat.
+    """
+    counts = collections.Counter()
+    skipped = 0
+    with Pool(processes) as pool:
+        pending = collections.deque()
+        max_pending = 2 * (processes or os.cpu_count())
+        for batch in read_batches(paths, batch_lines):
+            pending.append(pool.apply_async(classify_lines, (batch,)))
+            if len(pending) >= max_pending:
+                skipped += write_result(pending.popleft().get(), writer, counts)
+        while pending:
+            skipped += write_result(pending.popleft().get(), writer, counts)
+
+    return counts, skipped
+
+
+def write_result(result, writer, counts):
+    rows, batch_counts, skipped = result
+    writer.write(rows)
+    counts.update(batch_counts)
+
+    return skipped
+
+
+class ClassifiedWriter:
+    # Compact CSV or NDJSON output ('-' for stdout, '.gz' to compress)
+    def __init__(self, path, output_format="ndjson"):
+        self.output_format = output_format
+        if path == "-":
+            self.file = sys.stdout
+        elif path.endswith(".gz"):
+            self.file = gzip.open(path, "wt", encoding="utf-8", newline="")
+        else:
+            self.file = open(path, "w", encoding="utf-8", newline="")
+        self.csv_writer = None
+        if output_format == "csv":
+            self.csv_writer = csv.DictWriter(self.file, fieldnames=FIELDS)
+            self.csv_writer.writeheader()
+
+    def write(self, rows):
+        if self.csv_writer is not None:
+            self.csv_writer.writerows(rows)
+        else:
+            self.file.write("".join(json.dumps(row, separators=(",", ":"), ensure_ascii=False) + "\n"
+                                    for row in rows))
+
+    def close(self):
+        self.file.flush()
+        if self.file is not sys.stdout:
+            self.file.close()
+
+
+def print_counts(counts, stream=sys.stdout):
+    total = sum(counts.values())
+    print(f"Tweets classified: {total}", file=stream)
+    for tweet_type, count in counts.most_common():
+        print(f"  {tweet_type}: {count} ({count / total:.1%})", file=stream)
@@ -0,0 +1,230 @@
+# Shared HTTP client for the scripts in this repo - one keep-alive session with a sized connection
+# pool, default timeouts, and retries with jittered exponential backoff on 429/5xx responses and
+# connection errors. Requests are paced per endpoint family by a token-bucket scheduler shared by
+# every thread (and asyncio task) in the process. Scripts add the repo root to `sys.path` to import it.
+import asyncio
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+import requests
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+MAX_BACKOFF = 60
+MAX_RATE_LIMIT_WAITS = 20  # 429s are waited out on top of the normal retries
+
+# Endpoint families, checked in order, and their default requests per minute. The defaults can be
+# overridden with RATE_LIMIT_<FAMILY> in the '.env' file, e.g. RATE_LIMIT_SEARCH=120
+FAMILIES = (
+    ("counts", re.compile(r"/search/.*/counts\.json")),
+    ("search", re.compile(r"/search/")),
+    ("rules", re.compile(r"/rules/")),
+    ("engagement_totals", re.compile(r"/insights/engagement/totals")),
+    ("engagement_28hr", re.compile(r"/insights/engagement/28hr")),
+    ("engagement_historical", re.compile(r"/insights/engagement/historical")),
+)
+DEFAULT_LIMITS = {
+    "counts": 60,
+    "search": 60,
+    "rules": 60,
+    "engagement_totals": 60,
+    "engagement_28hr": 60,
+    "engagement_historical": 60,
+}
+
+
+def endpoint_family(url):
+    for family, pattern in FAMILIES:
+        if pattern.search(url):
+            return family
+
+    return None
+
+
+class TokenBucket:
+    """
+    Paces requests to `per_minute`, allowing short bursts. Callers reserve a token and are told
+    how long to wait for it, so waiters queue up fairly instead of polling.
+
+    The rate adapts to the server: a 429 halves it and pauses the bucket until Retry-After, each
+    success wins back a little of the configured rate, and x-rate-limit-remaining/-reset headers
+    cap the tokens available and pause the bucket when the window is used up.
+    """
+
+    def __init__(self, per_minute, burst=None):
+        self.max_rate = per_minute / 60.0
+        self.rate = self.max_rate
+        self.capacity = burst or max(1, per_minute // 10)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        # Takes a token and returns how many seconds to wait before using it
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+            return max(wait, self.paused_until - now)
+
+    def observe(self, status_code, headers):
+        with self.lock:
+            now = time.monotonic()
+            if status_code == 429:
+                if now >= self.paused_until:
+                    # Requests already in flight get 429s too - only slow down once per pause
+                    self.rate = max(self.rate / 2, self.max_rate / 16)
+                self.tokens = min(self.tokens, 0)
+                self.paused_until = max(self.paused_until, now + (retry_after(headers) or 1 / self.rate))
+                return
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+            remaining = headers.get("x-rate-limit-remaining")
+            if remaining is None or not remaining.isdigit():
+                return
+            self.tokens = min(self.tokens, int(remaining))
+            reset = headers.get("x-rate-limit-reset")
+            if int(remaining) == 0 and reset is not None and reset.isdigit():
+                # The reset header is an epoch timestamp
+                self.paused_until = max(self.paused_until, now + int(reset) - time.time())
+
+
+class RateLimitScheduler:
+    # One TokenBucket per endpoint family, created on first use
+    def __init__(self, limits=None):
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def bucket(self, url):
+        family = endpoint_family(url)
+        if family is None:
+            return None  # e.g. streams and data file downloads aren't rate limited
+        with self.lock:
+            if family not in self.buckets:
+                per_minute = float(os.getenv(f"RATE_LIMIT_{family.upper()}", self.limits[family]))
+                self.buckets[family] = TokenBucket(per_minute)
+
+            return self.buckets[family]
+
+    def configure(self, family, per_minute):
+        with self.lock:
+            self.limits[family] = per_minute
+            self.buckets[family] = TokenBucket(per_minute)
+
+    def acquire(self, url):
+        bucket = self.bucket(url)
+        if bucket is not None:
+            wait = bucket.reserve()
+            if wait > 0:
+                time.sleep(wait)
+
+    async def acquire_async(self, url):
+        bucket = self.bucket(url)
+        if bucket is not None:
+            wait = bucket.reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+    def observe(self, url, response):
+        bucket = self.bucket(url)
+        if bucket is not None:
+            bucket.observe(response.status_code, response.headers)
+
+
+# Shared by every session in the process, so concurrent workers draw from the same buckets
+SCHEDULER = RateLimitScheduler()
+
+
+def retry_after(headers):
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryingSession(requests.Session):
+    """
+    A requests.Session that retries failed requests. After the last retry the final response
+    is returned (or the exception raised) as usual, so callers handle errors the same way.
+    """
+
+    def __init__(self, pool_size=10, retries=5, backoff=1.0, timeout=(10, 60), retry_statuses=RETRY_STATUSES,
+                 scheduler=SCHEDULER, retry_exceptions=True):
+        super().__init__()
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.retry_statuses = retry_statuses
+        self.scheduler = scheduler
+        # Without retry_exceptions only connect timeouts are retried - the request was never sent, so
+        # a non-idempotent POST can't have taken effect
+        self.retry_exceptions = retry_exceptions
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        rate_limit_waits = 0
+        while True:
+            if self.scheduler is not None:
+                self.scheduler.acquire(url)
+            try:
+                response = super().request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt >= self.retries or not (self.retry_exceptions
+                                                   or isinstance(e, requests.exceptions.ConnectTimeout)):
+                    raise
+                delay = self.delay(attempt)
+                sys.stderr.write(f"{e.__class__.__name__} for {url}, retrying in {delay:.1f}s\n")
+            else:
+                if self.scheduler is not None:
+                    self.scheduler.observe(url, response)
+                # Only endpoints with a bucket are held back by the scheduler - any other 429 (e.g. too
+                # many stream connections) falls through to the normal Retry-After/backoff retries
+                if (response.status_code == 429 and 429 in self.retry_statuses and self.scheduler is not None
+                        and self.scheduler.bucket(url) is not None and rate_limit_waits < MAX_RATE_LIMIT_WAITS):
+                    # The scheduler now holds back every worker on this endpoint until the limit resets
+                    rate_limit_waits += 1
+                    sys.stderr.write(f"Rate limited on {url}, waiting\n")
+                    response.close()
+                    continue
+                if response.status_code not in self.retry_statuses or attempt >= self.retries:
+                    return response
+                delay = self.delay(attempt, response.headers.get("Retry-After"))
+                sys.stderr.write(f"Status {response.status_code} for {url}, retrying in {delay:.1f}s\n")
+                response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def delay(self, attempt, retry_after=None):
+        # Honour Retry-After when the server sends one, otherwise "full jitter" backoff
+        if retry_after is not None:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+
+        return random.uniform(0, min(MAX_BACKOFF, self.backoff * 2 ** attempt))
+
+
+def new_session(auth=None, pool_size=None, retries=None, retry_statuses=RETRY_STATUSES, retry_exceptions=True):
+    # Defaults can be overridden in the '.env' file
+    if pool_size is None:
+        pool_size = int(os.getenv("HTTP_POOL_SIZE", 10))
+    if retries is None:
+        retries = int(os.getenv("HTTP_MAX_RETRIES", 5))
+    timeout = (float(os.getenv("HTTP_CONNECT_TIMEOUT", 10)), float(os.getenv("HTTP_READ_TIMEOUT", 60)))
+    session = RetryingSession(pool_size=pool_size, retries=retries, timeout=timeout, retry_statuses=retry_statuses,
+                              retry_exceptions=retry_exceptions)
+    session.auth = auth
+
+    return session